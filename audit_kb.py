@@ -13,10 +13,12 @@ import os
 import logging
 from pathlib import Path
 from collections import defaultdict
-import requests
 from dotenv import load_dotenv
 from google import genai
-import json
+
+import kb_http
+import kb_state
+from kb_profile import profiler
 
 logging.basicConfig(
     level=logging.INFO,
@@ -31,7 +33,7 @@ load_dotenv(ENV_PATH)
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 STORE_NAME = os.getenv("FILE_SEARCH_STORE_NAME", "").strip()
-BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+TRANSPORT = kb_http.get_transport()
 
 if not GEMINI_API_KEY:
     raise RuntimeError("❌ Falta GEMINI_API_KEY en .env")
@@ -51,8 +53,10 @@ def get_metadata_value(doc, key: str) -> str:
     return ""
 
 def list_documents(store_name: str):
-    """Lista todos los documentos en el store usando el SDK de Google"""
+    """Lista todos los documentos en el store (SDK de Google o REST según KB_TRANSPORT)"""
     try:
+        if TRANSPORT == kb_http.TRANSPORT_REST:
+            return kb_http.list_documents(store_name, GEMINI_API_KEY)
         docs_iterator = client.file_search_stores.documents.list(parent=store_name)
         docs = list(docs_iterator)
         return docs
@@ -65,10 +69,12 @@ def main():
     logger.info("📋 AUDITORÍA DEL KB - FILE SEARCH STORE")
     logger.info("=" * 70)
     logger.info(f"\n📌 Store: {STORE_NAME[:50]}...")
+    logger.info(f"   Transporte: {TRANSPORT}")
     
     # Listar todos los documentos
     logger.info("\n🔍 Escaneando documentos...")
-    docs = list_documents(STORE_NAME)
+    with profiler.stage("list"):
+        docs = list_documents(STORE_NAME)
     
     logger.info(f"\n✅ TOTAL DE DOCUMENTOS: {len(docs)}")
     
@@ -80,26 +86,27 @@ def main():
     logger.info("\n" + "=" * 70)
     logger.info("📊 ANÁLISIS DETALLADO:")
     logger.info("=" * 70)
-    # Cargar sync_state.json (si existe) para detectar eliminados
-    sync_state_path = ROOT / "sync_state.json"
+    # Cargar el estado del sync (sync_state.json o sync_state.sqlite) para detectar eliminados
+    state_backend = kb_state.get_state_backend()
     sync_state = {}
     expected_store_ids = set()
     storeid_to_path = {}
-    if sync_state_path.exists():
-        try:
-            with open(sync_state_path, "r", encoding="utf-8") as fh:
-                sync_state = json.load(fh)
-            for p, meta in sync_state.items():
-                sid = meta.get("store_doc_id")
-                if sid:
-                    expected_store_ids.add(sid)
-                    storeid_to_path[sid] = p
-        except Exception as e:
-            logger.warning(f"⚠️  No se pudo leer sync_state.json: {e}")
-    else:
-        logger.info("⚠️  sync_state.json no encontrado en el repo; no se podrá calcular 'Eliminados'.")
+    with profiler.stage("state"):
+        if state_backend.path.exists():
+            try:
+                sync_state = state_backend.load()
+                for p, meta in sync_state.items():
+                    sid = meta.get("store_doc_id")
+                    if sid:
+                        expected_store_ids.add(sid)
+                        storeid_to_path[sid] = p
+            except Exception as e:
+                logger.warning(f"⚠️  No se pudo leer {state_backend.path.name}: {e}")
+        else:
+            logger.info(f"⚠️  {state_backend.path.name} no encontrado en el repo; no se podrá calcular 'Eliminados'.")
 
     # Conjuntos de documentos actuales
+    profiler.checkpoint("analyze")
     actual_store_ids = set()
     for d in docs:
         try:
@@ -117,9 +124,11 @@ def main():
     for doc in docs:
         path = get_metadata_value(doc, "path")
         section = get_metadata_value(doc, "section")
+        chunk = get_metadata_value(doc, "chunk")
         
         if path:
-            paths[path].append(doc)
+            # Docs partidos en secciones: una unidad por path#chunk (no son duplicados)
+            paths[f"{path}#{chunk}" if chunk else path].append(doc)
             if section:
                 sections[section] += 1
         else:
@@ -157,14 +166,14 @@ def main():
     logger.info("\n" + "=" * 70)
     logger.info("📈 RESUMEN:")
     logger.info(f"   Total: {len(docs)} documentos")
-    logger.info(f"   Únicos (por path): {len(paths)} paths")
+    logger.info(f"   Únicos (por path/sección): {len(paths)} unidades")
     logger.info(f"   Sin path: {len(no_path)}")
     logger.info(f"   Eliminados: {len(missing_store_ids)}")
     logger.info(f"   Duplicados: {len(duplicates)} paths con múltiples copias")
     logger.info("=" * 70)
 
     if missing_store_ids:
-        logger.warning("\n⚠️  ENCONTRADOS STORE IDS REFERENCIADOS EN sync_state.json PERO AUSENTES EN EL STORE:")
+        logger.warning(f"\n⚠️  ENCONTRADOS STORE IDS REFERENCIADOS EN {state_backend.path.name} PERO AUSENTES EN EL STORE:")
         for sid in sorted(missing_store_ids):
             path = storeid_to_path.get(sid, "(path desconocido)")
             logger.warning(f"   - {path} -> {sid}")
@@ -182,4 +191,5 @@ def main():
         logger.info(f"\n✅ Estado correcto: {len(paths)} documentos únicos sin duplicados")
 
 if __name__ == "__main__":
-    main()
+    with profiler.run("audit_kb"):
+        main()
@@ -8,10 +8,12 @@ import json
 import logging
 from pathlib import Path
 
-import requests
 from dotenv import load_dotenv
 from google import genai
 
+import kb_http
+from kb_profile import profiler
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
@@ -32,7 +34,10 @@ if not STORE_NAME:
     raise RuntimeError("❌ Falta FILE_SEARCH_STORE_NAME en .env")
 
 # Endpoint base según documentación oficial
-BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+BASE_URL = kb_http.BASE_URL
+
+# KB_PROFILE=sampling|cprofile: una etapa por TEST (se cierra al salir)
+profiler.start("diagnose_api")
 
 logger.info("=" * 70)
 logger.info("🔍 DIAGNÓSTICO DE API - FILE SEARCH")
@@ -45,13 +50,13 @@ logger.info(f"   Store Name: {STORE_NAME}")
 # ============================================================
 
 def fetch_documents_via_rest(url: str, api_key: str, page_size: int = 50) -> tuple[list, int]:
-    """Fetch first page of documents via REST API"""
+    """Fetch first page of documents via REST API (Session compartida con keep-alive)"""
     try:
-        response = requests.get(
+        response = kb_http.get_session().get(
             url,
-            params={"key": api_key, "pageSize": page_size},
-            timeout=30,
-            headers={"User-Agent": "GoogleGenAI/1.0"}
+            params={"pageSize": page_size},
+            headers={"x-goog-api-key": api_key},
+            timeout=kb_http.TIMEOUT,
         )
         response.raise_for_status()
         data = response.json()
@@ -62,7 +67,7 @@ def fetch_documents_via_rest(url: str, api_key: str, page_size: int = 50) -> tup
 
 
 def fetch_all_documents_paginated(url: str, api_key: str, max_pages: int = 10) -> list:
-    """Paginate through all documents"""
+    """Paginate through all documents (todas las páginas reutilizan la misma conexión)"""
     all_docs = []
     page_token = None
     page_count = 0
@@ -72,11 +77,16 @@ def fetch_all_documents_paginated(url: str, api_key: str, max_pages: int = 10) -
             page_count += 1
             logger.info(f"   Página {page_count}...")
             
-            params = {"key": api_key, "pageSize": 50}
+            params = {"pageSize": 50}
             if page_token:
                 params["pageToken"] = page_token
             
-            response = requests.get(url, params=params, timeout=30)
+            response = kb_http.get_session().get(
+                url,
+                params=params,
+                headers={"x-goog-api-key": api_key},
+                timeout=kb_http.TIMEOUT,
+            )
             response.raise_for_status()
             
             data = response.json()
@@ -97,6 +107,7 @@ def fetch_all_documents_paginated(url: str, api_key: str, max_pages: int = 10) -
 # ============================================================
 # TEST 1: Verificar Store usando SDK de Google
 # ============================================================
+profiler.checkpoint("test1-sdk-get")
 logger.info("\n\n🧪 TEST 1: Verificar Store con SDK de Google")
 logger.info("-" * 70)
 
@@ -113,6 +124,7 @@ except Exception as e:
 # ============================================================
 # TEST 2: Petición HTTPS a documents.list (como dice la docs)
 # ============================================================
+profiler.checkpoint("test2-rest-list")
 logger.info("\n\n🧪 TEST 2: Petición HTTPS directa a documents.list")
 logger.info("-" * 70)
 
@@ -143,6 +155,7 @@ else:
 # ============================================================
 # TEST 3: Paginar completamente
 # ============================================================
+profiler.checkpoint("test3-paginate")
 logger.info("\n\n🧪 TEST 3: Paginar completamente a través de todos los documentos")
 logger.info("-" * 70)
 
@@ -152,6 +165,7 @@ logger.info(f"\n✅ TOTAL ACUMULADO: {len(all_docs)} documentos")
 # ============================================================
 # TEST 4: Contar por estado
 # ============================================================
+profiler.checkpoint("test4-states")
 logger.info("\n\n🧪 TEST 4: Análisis de estados")
 logger.info("-" * 70)
 
@@ -178,6 +192,7 @@ logger.info(f"      STATE_FAILED = Error en procesamiento")
 # ============================================================
 # TEST 5: Verificar Store por SDK también
 # ============================================================
+profiler.checkpoint("test5-sdk-list")
 logger.info("\n\n🧪 TEST 5: Listar documentos por SDK (comparación)")
 logger.info("-" * 70)
 
@@ -200,7 +215,7 @@ except Exception as e:
 logger.info("\n\n" + "=" * 70)
 logger.info("📊 RESUMEN DE DIAGNÓSTICO")
 logger.info("=" * 70)
-logger.info(f"\n   HTTPS directo (requests): {len(all_docs)} documentos")
+logger.info(f"\n   HTTPS directo (requests.Session): {len(all_docs)} documentos")
 logger.info(f"   SDK (genai.Client): {len(docs_list) if 'docs_list' in locals() else 'error'} documentos")
 logger.info(f"\n   ❓ Si los números no coinciden, posible problema:")
 logger.info(f"      • Documentos en STATE_PENDING no aparecen en listado")
@@ -209,3 +224,4 @@ logger.info(f"      • Problema con autenticación")
 logger.info(f"      • Problema con paginación")
 
 logger.info("\n✅ Diagnóstico completado")
+profiler.stop()
@@ -0,0 +1,145 @@
+"""
+Helpers puros sobre documentos del KB (sin cliente de API ni efectos al importar).
+
+Los usan sync_kb_to_store.py y cualquier consumidor local (índice offline,
+bot) que necesite el mismo hash, frontmatter y metadata que se sube al Store.
+"""
+
+import hashlib
+import logging
+from functools import lru_cache
+from typing import Dict, Optional, Tuple, List
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# libyaml (C) si PyYAML se compiló con ella; si no, el loader puro de Python
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+FRONTMATTER_MAX_LINES = 300
+FRONTMATTER_CACHE_SIZE = 4096
+
+# Campos del frontmatter que se suben como metadata (incluye nuevo esquema solicitado)
+KEYS_TO_TAKE = [
+    "title",
+    "description",
+    "doc_type",
+    "owner",
+    "owner_team",    # compatibilidad
+    "maintainer",
+    "visibility",
+    "last_updated",
+    "last_review",
+    "review_cycle_days",
+]
+
+
+def sha256_text(s: str) -> str:
+    """Calcula hash SHA256 de un texto"""
+    return hashlib.sha256(s.encode("utf-8", errors="ignore")).hexdigest()
+
+
+def _strip_line(text: str, pos: int) -> Tuple[str, int]:
+    """Línea que empieza en `pos` (sin espacios) y posición de la siguiente"""
+    nl = text.find("\n", pos)
+    if nl < 0:
+        return text[pos:].strip(), len(text)
+    return text[pos:nl].strip(), nl + 1
+
+
+@lru_cache(maxsize=FRONTMATTER_CACHE_SIZE)
+def _load_frontmatter_yaml(fm_raw: str) -> Optional[Dict]:
+    """
+    YAML del frontmatter → dict, cacheado por contenido (mismo header = sin
+    re-parsear). None si no parsea o no es un mapping: no era frontmatter.
+    """
+    try:
+        data = yaml.load(fm_raw, Loader=_YAML_LOADER)
+    except Exception as e:
+        logger.debug(f"⚠️ Frontmatter parse error (ignorado): {e}")
+        return None
+    if data is None:
+        return {}
+    return data if isinstance(data, dict) else None
+
+
+def parse_frontmatter(md_text: str) -> Tuple[Dict, str]:
+    """
+    Extrae YAML frontmatter entre --- ... --- sin excepciones.
+    Devuelve (frontmatter, cuerpo sin frontmatter). Si el bloque --- ... ---
+    no es un mapping YAML (ej. el doc abre con una línea horizontal) no es
+    frontmatter: devuelve ({}, texto completo) sin perder contenido.
+
+    Tolera el delimitador duplicado ("---" dos veces seguidas) que arrastran
+    los docs copiados de kb/TEMPLATE.md.
+
+    Solo recorre las líneas del header (como mucho FRONTMATTER_MAX_LINES) con
+    índices sobre el texto, sin copiar ni partir el archivo entero. El YAML
+    se parsea con CSafeLoader (libyaml) si está disponible y se cachea.
+    """
+    n = len(md_text)
+    line, pos = _strip_line(md_text, 0)
+    if line != "---":
+        return {}, md_text
+
+    index = 1
+    if pos < n:
+        line, after = _strip_line(md_text, pos)
+        if line == "---":
+            pos, index = after, 2
+    fm_start = pos
+
+    fm_end = None
+    while pos < n and index < FRONTMATTER_MAX_LINES:
+        line, after = _strip_line(md_text, pos)
+        if line == "---":
+            fm_end = pos
+            pos = after
+            break
+        pos = after
+        index += 1
+    if fm_end is None:
+        return {}, md_text
+
+    if pos < n:
+        line, after = _strip_line(md_text, pos)
+        if line == "---":
+            pos = after
+    fm = _load_frontmatter_yaml(md_text[fm_start:fm_end])
+    if fm is None:
+        return {}, md_text
+
+    # Copia superficial: la entrada cacheada no debe mutarse desde fuera
+    return dict(fm), md_text[pos:]
+
+
+def build_metadata(kb_path: str, section: str, hash_val: str, fm: Dict) -> List[Dict]:
+    """Construye lista de metadata para subir a Store"""
+    meta = [
+        {"key": "path", "string_value": kb_path},
+        {"key": "section", "string_value": section},
+        {"key": "hash", "string_value": hash_val},
+    ]
+
+    # Agregar campos del frontmatter
+    for key in KEYS_TO_TAKE:
+        if key in fm and fm.get(key) is not None:
+            val = fm.get(key)
+            if isinstance(val, list):
+                val_s = ",".join([str(x) for x in val])
+            else:
+                val_s = str(val)
+            meta.append({"key": key, "string_value": val_s})
+
+    # Agregar keywords si existen
+    keywords = fm.get("keywords")
+    if isinstance(keywords, list) and keywords:
+        meta.append({"key": "keywords_csv", "string_value": ",".join([str(k) for k in keywords])})
+
+    return meta
+
+
+def metadata_dict(meta: List[Dict]) -> Dict[str, str]:
+    """Convierte la lista de build_metadata en un dict key -> string_value"""
+    return {m["key"]: m["string_value"] for m in meta}
@@ -0,0 +1,303 @@
+"""
+Grafo de links y metadata del KB, precalculado en el sync.
+
+Tablas (en kb_index.sqlite, junto al índice BM25; se regenera desde kb/):
+- graph_docs     → path, hash, title, owner, doc_type, last_review,
+                   review_cycle_days y review_due (last_review + ciclo)
+- graph_links    → links Markdown entre docs del KB (src → dst#anchor),
+                   resueltos a kb_path; los externos no se guardan
+- graph_keywords → keyword → paths (keywords del frontmatter, en minúsculas)
+
+Actualización incremental con el mismo diff de hashes que el índice local:
+solo se re-parsean los archivos cuyo hash cambió.
+
+Consultas (por clave indexada, sin recorrer ni parsear kb/):
+    from kb_graph import KbGraph
+    with KbGraph() as graph:
+        graph.inbound("kb/shared/glossary.md")     # qué enlaza aquí
+        graph.outbound("kb/growth/overview.md")
+        graph.stale()                               # docs con revisión vencida
+        graph.paths_for_keyword("utm")
+        graph.paths_for_owner("@growth")
+        graph.inbound_counts(paths)                 # boost de retrieval
+
+CLI:
+    python kb_graph.py inbound kb/shared/glossary.md
+    python kb_graph.py outbound kb/growth/overview.md
+    python kb_graph.py stale [YYYY-MM-DD]
+    python kb_graph.py keyword utm
+    python kb_graph.py owner @growth
+    python kb_graph.py broken
+    python kb_graph.py --rebuild
+"""
+
+import re
+import sys
+import sqlite3
+import logging
+import posixpath
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from kb_docs import parse_frontmatter
+from kb_local_index import INDEX_FILE, ROOT, scan_kb_hashes
+
+logger = logging.getLogger(__name__)
+
+# [texto](destino) — sin imágenes; el destino termina en espacio o ")"
+_LINK_RE = re.compile(r"(?<!!)\[[^\]]*\]\(\s*<?([^)\s>]+)>?(?:\s+\"[^\"]*\")?\s*\)")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_INLINE_CODE_RE = re.compile(r"`[^`]*`")
+_EXTERNAL_RE = re.compile(r"^[a-z][a-z0-9+.-]*:", re.IGNORECASE)  # http:, mailto:, ...
+
+OWNER_KEYS = ("owner", "owner_team", "maintainer")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS graph_docs (
+    path TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    title TEXT,
+    owner TEXT COLLATE NOCASE,
+    doc_type TEXT,
+    last_review TEXT,
+    review_cycle_days INTEGER,
+    review_due TEXT
+);
+CREATE INDEX IF NOT EXISTS graph_docs_owner ON graph_docs (owner);
+CREATE INDEX IF NOT EXISTS graph_docs_due ON graph_docs (review_due);
+CREATE TABLE IF NOT EXISTS graph_links (
+    src TEXT NOT NULL,
+    dst TEXT NOT NULL,
+    anchor TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (src, dst, anchor)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS graph_links_dst ON graph_links (dst);
+CREATE TABLE IF NOT EXISTS graph_keywords (
+    keyword TEXT NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (keyword, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS graph_keywords_path ON graph_keywords (path);
+"""
+
+
+def extract_links(kb_path: str, body: str) -> List[Tuple[str, str]]:
+    """Links a otros .md del KB como [(kb_path destino, anchor)] (fuera de bloques de código)"""
+    base = posixpath.dirname(kb_path)
+    links = []
+    in_fence = False
+    for line in body.split("\n"):
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+            continue
+        if in_fence or "](" not in line:
+            continue
+        for target in _LINK_RE.findall(_INLINE_CODE_RE.sub("", line)):
+            if _EXTERNAL_RE.match(target) or target.startswith("#"):
+                continue
+            target, _, anchor = target.partition("#")
+            if not target.lower().endswith(".md"):
+                continue
+            dst = posixpath.normpath(posixpath.join(base, target))
+            if dst.startswith("kb/"):
+                links.append((dst, anchor))
+    return list(dict.fromkeys(links))
+
+
+def _as_date(value) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def review_due(fm: Dict) -> Tuple[Optional[str], Optional[int], Optional[str]]:
+    """(last_review, review_cycle_days, review_due) como ISO; None si faltan o no son válidos"""
+    last = _as_date(fm.get("last_review") or fm.get("last_updated"))
+    try:
+        cycle = int(fm.get("review_cycle_days"))
+    except (TypeError, ValueError):
+        cycle = None
+    due = (last + timedelta(days=cycle)).isoformat() if last and cycle else None
+    return (last.isoformat() if last else None), cycle, due
+
+
+def _owner(fm: Dict) -> Optional[str]:
+    for key in OWNER_KEYS:
+        if fm.get(key):
+            return str(fm[key]).strip()
+    return None
+
+
+class KbGraph:
+    """Grafo de links + mapas de metadata sobre SQLite"""
+
+    def __init__(self, path: Path = INDEX_FILE):
+        self.path = Path(path)
+        # Igual que LocalIndex: el bot puede aplicar manifiestos desde otro hilo
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    # ─── Actualización ───────────────────────────────────────────
+
+    def indexed_hashes(self) -> Dict[str, str]:
+        """{kb_path -> hash} de lo que hay en el grafo"""
+        return {row["path"]: row["hash"] for row in self.conn.execute("SELECT path, hash FROM graph_docs")}
+
+    def upsert(self, kb_path: str, hash_val: str, fm: Dict, body: str):
+        """(Re)calcula links, keywords, owner y fecha de revisión de un documento"""
+        self.remove(kb_path)
+        last_review, cycle, due = review_due(fm)
+        self.conn.execute(
+            "INSERT INTO graph_docs (path, hash, title, owner, doc_type, last_review, review_cycle_days, review_due) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (kb_path, hash_val, str(fm.get("title") or ""), _owner(fm), fm.get("doc_type"),
+             last_review, cycle, due),
+        )
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO graph_links (src, dst, anchor) VALUES (?, ?, ?)",
+            [(kb_path, dst, anchor) for dst, anchor in extract_links(kb_path, body)],
+        )
+        keywords = fm.get("keywords")
+        if isinstance(keywords, list):
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO graph_keywords (keyword, path) VALUES (?, ?)",
+                [(str(k).strip().lower(), kb_path) for k in keywords if str(k).strip()],
+            )
+
+    def remove(self, kb_path: str):
+        self.conn.execute("DELETE FROM graph_docs WHERE path = ?", (kb_path,))
+        self.conn.execute("DELETE FROM graph_links WHERE src = ?", (kb_path,))
+        self.conn.execute("DELETE FROM graph_keywords WHERE path = ?", (kb_path,))
+
+    def apply(self, changed: Dict[str, str], removed: Iterable[str], root: Path = ROOT) -> int:
+        """
+        Aplica un diff de hashes: `changed` = {kb_path -> nuevo hash}, `removed` = paths borrados.
+        Los links entrantes a un doc borrado se conservan (quedan como rotos).
+        """
+        updated = 0
+        with self._lock, self.conn:
+            for kb_path, hash_val in changed.items():
+                text = (root / kb_path).read_text(encoding="utf-8", errors="ignore")
+                fm, body = parse_frontmatter(text)
+                self.upsert(kb_path, hash_val, fm, body)
+                updated += 1
+            for kb_path in removed:
+                self.remove(kb_path)
+        return updated
+
+    def refresh(self, current_hashes: Dict[str, str], root: Path = ROOT) -> Dict[str, int]:
+        """Sincroniza el grafo con {kb_path -> hash} (solo toca lo que cambió)"""
+        with self._lock:
+            indexed = self.indexed_hashes()
+        changed = {p: h for p, h in current_hashes.items() if indexed.get(p) != h}
+        removed = [p for p in indexed if p not in current_hashes]
+        self.apply(changed, removed, root)
+        return {"updated": len(changed), "removed": len(removed), "unchanged": len(current_hashes) - len(changed)}
+
+    # ─── Consultas ───────────────────────────────────────────────
+
+    def _column(self, sql: str, params: tuple) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self.conn.execute(sql, params)]
+
+    def inbound(self, kb_path: str) -> List[str]:
+        """Docs que enlazan a `kb_path` ("qué enlaza aquí")"""
+        return self._column("SELECT DISTINCT src FROM graph_links WHERE dst = ? ORDER BY src", (kb_path,))
+
+    def outbound(self, kb_path: str) -> List[str]:
+        """Docs del KB a los que enlaza `kb_path`"""
+        return self._column("SELECT DISTINCT dst FROM graph_links WHERE src = ? ORDER BY dst", (kb_path,))
+
+    def inbound_counts(self, paths: Iterable[str]) -> Dict[str, int]:
+        """{path -> nº de docs que lo enlazan}, para dar boost en retrieval"""
+        paths = list(dict.fromkeys(paths))
+        if not paths:
+            return {}
+        marks = ",".join("?" * len(paths))
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT dst, COUNT(DISTINCT src) FROM graph_links WHERE dst IN ({marks}) GROUP BY dst", paths
+            ).fetchall()
+        counts = dict.fromkeys(paths, 0)
+        counts.update({dst: n for dst, n in rows})
+        return counts
+
+    def paths_for_keyword(self, keyword: str) -> List[str]:
+        return self._column("SELECT path FROM graph_keywords WHERE keyword = ? ORDER BY path",
+                            (keyword.strip().lower(),))
+
+    def paths_for_owner(self, owner: str) -> List[str]:
+        return self._column("SELECT path FROM graph_docs WHERE owner = ? ORDER BY path", (owner.strip(),))
+
+    def stale(self, as_of: Optional[date] = None) -> List[Dict]:
+        """Docs con revisión vencida a fecha `as_of` (default hoy), los más atrasados primero"""
+        as_of = as_of or date.today()
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT path, title, owner, last_review, review_cycle_days, review_due FROM graph_docs "
+                "WHERE review_due IS NOT NULL AND review_due <= ? ORDER BY review_due, path",
+                (as_of.isoformat(),),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def broken_links(self) -> List[Tuple[str, str]]:
+        """[(src, dst)] de links a docs que no existen en el KB"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT l.src, l.dst FROM graph_links l LEFT JOIN graph_docs d ON d.path = l.dst "
+                "WHERE d.path IS NULL ORDER BY l.src, l.dst"
+            ).fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = sys.argv[1:]
+    with KbGraph() as graph:
+        if args and args[0] == "--rebuild":
+            with graph.conn:
+                for table in ("graph_docs", "graph_links", "graph_keywords"):
+                    graph.conn.execute(f"DELETE FROM {table}")
+            args = args[1:]
+        result = graph.refresh(scan_kb_hashes())
+        logger.info(f"🕸️  Grafo del KB: {result['updated']} actualizados, "
+                    f"{result['removed']} eliminados, {result['unchanged']} sin cambios")
+        command, rest = (args[0], args[1:]) if args else (None, [])
+        if command in ("inbound", "outbound") and rest:
+            for p in getattr(graph, command)(rest[0]):
+                logger.info(f"   {p}")
+        elif command == "stale":
+            for doc in graph.stale(date.fromisoformat(rest[0]) if rest else None):
+                logger.info(f"   ⏰ {doc['review_due']}  {doc['path']}  ({doc['owner'] or 'sin owner'})")
+        elif command == "keyword" and rest:
+            for p in graph.paths_for_keyword(" ".join(rest)):
+                logger.info(f"   {p}")
+        elif command == "owner" and rest:
+            for p in graph.paths_for_owner(rest[0]):
+                logger.info(f"   {p}")
+        elif command == "broken":
+            for src, dst in graph.broken_links():
+                logger.info(f"   ❌ {src} → {dst}")
+        elif command:
+            print(__doc__)
+            sys.exit(1)
@@ -0,0 +1,220 @@
+"""
+Transporte REST compartido para acceso directo a la API de File Search.
+
+Todas las llamadas HTTP directas (listados paginados, borrados masivos,
+diagnóstico) pasan por una única requests.Session con:
+- Pool de conexiones reutilizables (HTTP keep-alive, sin handshake TCP+TLS por página)
+- Compresión gzip en las respuestas
+- Reintentos con backoff para 429/5xx
+- API key en cabecera (no aparece en URLs ni en logs)
+
+Elección explícita del transporte (KB_TRANSPORT en .env):
+- sdk  → google-genai (default)
+- rest → este módulo, para listados grandes y borrados en bloque
+
+Los documentos devueltos por REST se adaptan a objetos con la misma forma que
+los del SDK (name, display_name, state, custom_metadata[].key/.string_value),
+así los scripts no necesitan distinguir el origen.
+"""
+
+import os
+import time
+import logging
+import threading
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+TRANSPORT_SDK = "sdk"
+TRANSPORT_REST = "rest"
+
+# La API limita documents.list a 20 documentos por página
+DOCUMENTS_PAGE_SIZE = 20
+
+POOL_CONNECTIONS = int(os.getenv("KB_HTTP_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.getenv("KB_HTTP_POOL_MAXSIZE", "16"))
+TIMEOUT = (5, 30)  # (connect, read) en segundos
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_transport() -> str:
+    """Transporte configurado para listados y borrados: 'sdk' o 'rest'"""
+    transport = os.getenv("KB_TRANSPORT", TRANSPORT_SDK).strip().lower()
+    if transport not in (TRANSPORT_SDK, TRANSPORT_REST):
+        logger.warning(f"⚠️ KB_TRANSPORT desconocido '{transport}', usando '{TRANSPORT_SDK}'")
+        return TRANSPORT_SDK
+    return transport
+
+
+def get_session() -> requests.Session:
+    """Devuelve la Session compartida (se crea una sola vez por proceso)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=5,
+                    backoff_factor=0.5,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset({"GET", "DELETE"}),
+                    respect_retry_after_header=True,
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_CONNECTIONS,
+                    pool_maxsize=POOL_MAXSIZE,
+                    max_retries=retry,
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.headers.update({
+                    "User-Agent": "GoogleGenAI/1.0",
+                    "Accept-Encoding": "gzip, deflate",
+                    "Connection": "keep-alive",
+                })
+                _session = session
+    return _session
+
+
+def _auth_headers(api_key: str) -> Dict[str, str]:
+    return {"x-goog-api-key": api_key}
+
+
+def fetch_documents_page(store_name: str, api_key: str, page_token: Optional[str] = None,
+                         page_size: int = DOCUMENTS_PAGE_SIZE) -> dict:
+    """Pide una página de documents.list y devuelve el JSON crudo"""
+    params = {"pageSize": page_size}
+    if page_token:
+        params["pageToken"] = page_token
+    response = get_session().get(
+        f"{BASE_URL}/{store_name}/documents",
+        params=params,
+        headers=_auth_headers(api_key),
+        timeout=TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def iter_document_pages(store_name: str, api_key: str, max_pages: Optional[int] = None) -> Iterator[List[dict]]:
+    """Itera documents.list página a página (sin cargar todo el Store en memoria)"""
+    page_token = None
+    pages = 0
+    while max_pages is None or pages < max_pages:
+        data = fetch_documents_page(store_name, api_key, page_token)
+        pages += 1
+        yield data.get("documents", [])
+        page_token = data.get("nextPageToken")
+        if not page_token:
+            break
+
+
+def as_document(raw: dict) -> SimpleNamespace:
+    """Adapta un documento JSON de REST a la forma de types.Document del SDK"""
+    custom_metadata = [
+        SimpleNamespace(key=m.get("key"), string_value=m.get("stringValue"))
+        for m in raw.get("customMetadata", [])
+    ]
+    return SimpleNamespace(
+        name=raw.get("name"),
+        display_name=raw.get("displayName"),
+        state=raw.get("state"),
+        custom_metadata=custom_metadata,
+    )
+
+
+def iter_documents(store_name: str, api_key: str) -> Iterator[SimpleNamespace]:
+    """Itera todos los documentos del Store vía REST"""
+    for page in iter_document_pages(store_name, api_key):
+        for raw in page:
+            yield as_document(raw)
+
+
+def list_documents(store_name: str, api_key: str) -> List[SimpleNamespace]:
+    """Lista todos los documentos del Store vía REST"""
+    return list(iter_documents(store_name, api_key))
+
+
+def delete_document(doc_name: str, api_key: str, force: bool = True) -> None:
+    """Borra un documento vía REST (lanza excepción si falla)"""
+    response = get_session().delete(
+        f"{BASE_URL}/{doc_name}",
+        params={"force": "true" if force else "false"},
+        headers=_auth_headers(api_key),
+        timeout=TIMEOUT,
+    )
+    response.raise_for_status()
+
+
+def get_operation(operation_name: str, api_key: str) -> dict:
+    """GET de una operación larga (ej. .../upload/operations/...) y devuelve el JSON crudo"""
+    response = get_session().get(
+        f"{BASE_URL}/{operation_name}",
+        headers=_auth_headers(api_key),
+        timeout=TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def as_operation(raw: dict) -> SimpleNamespace:
+    """Adapta una operación de subida JSON de REST a la forma de la Operation del SDK"""
+    response = raw.get("response") or {}
+    return SimpleNamespace(
+        name=raw.get("name"),
+        done=bool(raw.get("done")),
+        error=raw.get("error"),
+        response=SimpleNamespace(document_name=response.get("documentName")) if response else None,
+    )
+
+
+def is_not_found(error: Exception) -> bool:
+    """True si el error es un 404 (REST o SDK): el recurso ya no existe"""
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 404:
+        return True
+    return getattr(error, "code", None) == 404
+
+
+def get_store(store_name: str, api_key: str) -> dict:
+    """GET del File Search Store (incluye activeDocumentsCount, pendingDocumentsCount, ...)"""
+    response = get_session().get(
+        f"{BASE_URL}/{store_name}",
+        headers=_auth_headers(api_key),
+        timeout=TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+class RateLimiter:
+    """Token bucket thread-safe: como mucho `rate` llamadas por segundo (ráfagas de hasta `burst`)"""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return  # sin límite
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,196 @@
+"""
+Índice local full-text (BM25) del KB para recuperación offline.
+
+Primer nivel de baja latencia y fallback cuando el File Search Store está
+lento, con rate-limit o caído. Indexa los mismos documentos y la misma
+metadata que sube sync_kb_to_store.py (path, section, title, keywords_csv,
+doc_type) en un archivo SQLite FTS5 (kb_index.sqlite, ignorado en Git).
+
+Actualización incremental:
+- Cada documento guarda el SHA256 del archivo .md crudo (una fila por
+  archivo). No es el hash de sync_state.json: ese es por unidad (doc o
+  sección "kb/x.md#seccion") y sale de body_hash + meta_hash del texto
+  preprocesado, así que no se pueden comparar entre sí
+- refresh() solo reindexa paths cuyo hash cambió y borra los que ya no existen
+- El cuerpo indexado es el del doc sin frontmatter (el frontmatter va como
+  metadata, igual que en el Store)
+
+Uso desde el bot:
+    from kb_local_index import LocalIndex
+    with LocalIndex() as index:
+        hits = index.search("cómo lanzo una campaña", limit=5)
+
+CLI:
+    python kb_local_index.py "pregunta"       # refresca y consulta
+    python kb_local_index.py --rebuild         # reconstruye desde cero
+"""
+
+import re
+import sys
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from kb_docs import sha256_text, parse_frontmatter, build_metadata, metadata_dict
+
+logger = logging.getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parent
+KB_DIR = ROOT / "kb"
+INDEX_FILE = ROOT / "kb_index.sqlite"
+
+# Pesos BM25 por columna (mismo orden que docs_fts; path no se indexa)
+BM25_WEIGHTS = (0.0, 10.0, 5.0, 2.0, 1.0)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    path TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    section TEXT,
+    title TEXT,
+    keywords_csv TEXT,
+    doc_type TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
+    path UNINDEXED,
+    title,
+    keywords,
+    section,
+    body,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+
+def fts_query(question: str) -> str:
+    """Convierte una pregunta libre en una consulta FTS5 segura (términos en OR)"""
+    terms = [t for t in _TOKEN_RE.findall(question.lower()) if len(t) > 1]
+    return " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+
+
+class LocalIndex:
+    """Índice BM25 sobre SQLite FTS5"""
+
+    def __init__(self, path: Path = INDEX_FILE):
+        self.path = Path(path)
+        # El bot puede aplicar manifiestos desde otro hilo (kb_manifest.ManifestWatcher)
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def indexed_hashes(self) -> Dict[str, str]:
+        """{kb_path -> hash} de lo que hay indexado"""
+        return {row["path"]: row["hash"] for row in self.conn.execute("SELECT path, hash FROM docs")}
+
+    def upsert(self, kb_path: str, hash_val: str, section: str, fm: Dict, body: str):
+        """Indexa (o reindexa) un documento (cuerpo sin frontmatter) con la misma metadata que el Store"""
+        meta = metadata_dict(build_metadata(kb_path, section, hash_val, fm))
+        self.remove(kb_path)
+        self.conn.execute(
+            "INSERT INTO docs (path, hash, section, title, keywords_csv, doc_type) VALUES (?, ?, ?, ?, ?, ?)",
+            (kb_path, hash_val, section, meta.get("title", ""), meta.get("keywords_csv", ""), meta.get("doc_type", "")),
+        )
+        self.conn.execute(
+            "INSERT INTO docs_fts (path, title, keywords, section, body) VALUES (?, ?, ?, ?, ?)",
+            (kb_path, meta.get("title", ""), meta.get("keywords_csv", "").replace(",", " "), section, body),
+        )
+
+    def remove(self, kb_path: str):
+        self.conn.execute("DELETE FROM docs WHERE path = ?", (kb_path,))
+        self.conn.execute("DELETE FROM docs_fts WHERE path = ?", (kb_path,))
+
+    def apply(self, changed: Dict[str, str], removed: Iterable[str], root: Path = ROOT) -> int:
+        """
+        Aplica un diff de hashes: `changed` = {kb_path -> nuevo hash}, `removed` = paths borrados.
+        Devuelve cuántos documentos se reindexaron.
+        """
+        reindexed = 0
+        with self._lock, self.conn:
+            for kb_path, hash_val in changed.items():
+                text = (root / kb_path).read_text(encoding="utf-8", errors="ignore")
+                fm, body = parse_frontmatter(text)
+                section = kb_path.split("/", 1)[1].split("/", 1)[0]
+                self.upsert(kb_path, hash_val, section, fm, body)
+                reindexed += 1
+            for kb_path in removed:
+                self.remove(kb_path)
+        return reindexed
+
+    def refresh(self, current_hashes: Dict[str, str], root: Path = ROOT) -> Dict[str, int]:
+        """Sincroniza el índice con {kb_path -> hash} (solo toca lo que cambió)"""
+        with self._lock:
+            indexed = self.indexed_hashes()
+        changed = {p: h for p, h in current_hashes.items() if indexed.get(p) != h}
+        removed = [p for p in indexed if p not in current_hashes]
+        self.apply(changed, removed, root)
+        return {"reindexed": len(changed), "removed": len(removed), "unchanged": len(current_hashes) - len(changed)}
+
+    def search(self, question: str, limit: int = 5, section: Optional[str] = None,
+               doc_type: Optional[str] = None) -> List[Dict]:
+        """Búsqueda BM25; devuelve [{path, title, section, doc_type, keywords_csv, score, snippet}]"""
+        query = fts_query(question)
+        if not query:
+            return []
+        sql = (
+            "SELECT d.path, d.title, d.section, d.doc_type, d.keywords_csv, "
+            f"bm25(docs_fts, {', '.join(str(w) for w in BM25_WEIGHTS)}) AS score, "
+            "snippet(docs_fts, 4, '[', ']', '…', 12) AS snippet "
+            "FROM docs_fts JOIN docs d ON d.path = docs_fts.path "
+            "WHERE docs_fts MATCH ?"
+        )
+        params: list = [query]
+        if section:
+            sql += " AND d.section = ?"
+            params.append(section)
+        if doc_type:
+            sql += " AND d.doc_type = ?"
+            params.append(doc_type)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+        # bm25() devuelve valores negativos (más negativo = más relevante)
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [{**dict(row), "score": -row["score"]} for row in rows]
+
+
+def scan_kb_hashes(kb_dir: Path = KB_DIR) -> Dict[str, str]:
+    """{kb_path -> sha256} de los .md de kb/ (mismo criterio que el sync)"""
+    hashes = {}
+    for p in sorted(kb_dir.rglob("*.md")):
+        if p.name.lower() == "template.md":
+            continue
+        kb_path = f"kb/{p.relative_to(kb_dir).as_posix()}"
+        hashes[kb_path] = sha256_text(p.read_text(encoding="utf-8", errors="ignore"))
+    return hashes
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = sys.argv[1:]
+    if args and args[0] == "--rebuild":
+        INDEX_FILE.unlink(missing_ok=True)
+        args = args[1:]
+    with LocalIndex() as index:
+        result = index.refresh(scan_kb_hashes())
+        logger.info(f"📚 Índice local: {result['reindexed']} reindexados, "
+                    f"{result['removed']} eliminados, {result['unchanged']} sin cambios")
+        if args:
+            for hit in index.search(" ".join(args)):
+                logger.info(f"   {hit['score']:.2f}  {hit['path']}  ({hit['title']})")
+                logger.info(f"         {hit['snippet']}")
@@ -0,0 +1,203 @@
+"""
+Manifiesto de cambios del sync, para recargar el bot en caliente.
+
+sync_kb_to_store.py publica tras cada run un JSON compacto
+(kb_change_manifest.json, escritura atómica):
+
+{
+  "kb_version": "b4047b696ba51ff3",
+  "previous_version": "9c1e0d2a7f3b4c55",
+  "store_name": "fileSearchStores/...",
+  "generated_at": "2025-12-21T10:00:00+00:00",
+  "added":   {"kb/x.md": {"hash": "...", "store_doc_id": "fileSearchStores/.../documents/..."}},
+  "changed": {"kb/y.md#seccion": {"hash": "...", "store_doc_id": "..."}},
+  "removed": ["kb/z.md"]
+}
+
+Las claves son unidades de sync_state.json (doc completo o "path#sección").
+
+Un proceso en marcha (el bot) lo aplica sin reiniciarse:
+- ManifestWatcher detecta un manifiesto nuevo (mtime + versión)
+- apply_manifest() invalida solo las entradas de cache afectadas y
+  reindexa solo esos paths en el índice local (y en el grafo, kb_graph.py)
+- Si previous_version no coincide con la versión que tiene el proceso
+  (se perdió un manifiesto), se recarga el estado completo del mismo
+  Store destino (sync_state.<alias>.json / .db) como fallback
+
+Uso desde el bot:
+    from kb_manifest import ManifestWatcher
+    watcher = ManifestWatcher(cache=cache, index=index, graph=graph)
+    watcher.start()          # hilo daemon con polling
+    # Bot de otro destino de KB_STORE_TARGETS: manifiesto y estado de su alias
+    ManifestWatcher(cache=cache, index=index, alias="staging").start()
+"""
+
+import os
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from kb_docs import sha256_text
+from kb_preprocess import unit_path
+from kb_query_cache import QueryCache, kb_version, path_hashes
+from kb_state import DEFAULT_ALIAS, get_state_backend
+
+logger = logging.getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parent
+MANIFEST_FILE = Path(os.getenv("KB_MANIFEST_PATH", str(ROOT / "kb_change_manifest.json")))
+POLL_SECONDS = 2.0
+
+
+def manifest_file_for(alias: Optional[str] = None) -> Path:
+    """Manifiesto de un Store destino: kb_change_manifest.<alias>.json (default → MANIFEST_FILE)"""
+    if not alias or alias == DEFAULT_ALIAS:
+        return MANIFEST_FILE
+    return MANIFEST_FILE.with_name(f"{MANIFEST_FILE.stem}.{alias}{MANIFEST_FILE.suffix}")
+
+
+def build_manifest(old_state: Dict[str, dict], new_state: Dict[str, dict], store_name: str,
+                   changed_paths: Iterable[str]) -> dict:
+    """
+    Construye el manifiesto a partir del estado anterior y el nuevo.
+    `changed_paths` = paths re-subidos en este run (nuevos o actualizados).
+    """
+    added, changed = {}, {}
+    for kb_path in changed_paths:
+        entry = new_state.get(kb_path)
+        if entry is None:
+            continue
+        target = changed if kb_path in old_state else added
+        target[kb_path] = {"hash": entry.get("hash"), "store_doc_id": entry.get("store_doc_id")}
+    removed = sorted(p for p in old_state if p not in new_state)
+    return {
+        "kb_version": kb_version(path_hashes(new_state)),
+        "previous_version": kb_version(path_hashes(old_state)),
+        "store_name": store_name,
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "added": added,
+        "changed": changed,
+        "removed": removed,
+    }
+
+
+def write_manifest(manifest: dict, path: Path = MANIFEST_FILE):
+    """Escribe el manifiesto de forma atómica (tmp + rename)"""
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(manifest, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def read_manifest(path: Path = MANIFEST_FILE) -> Optional[dict]:
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def manifest_paths(manifest: dict) -> set:
+    """Todos los archivos del KB tocados por el manifiesto"""
+    keys = set(manifest.get("added", {})) | set(manifest.get("changed", {})) | set(manifest.get("removed", []))
+    return {unit_path(k) for k in keys}
+
+
+def apply_manifest(manifest: dict, cache: Optional[QueryCache] = None, index=None,
+                   root: Path = ROOT, graph=None, state_backend=None) -> Dict[str, int]:
+    """
+    Aplica un manifiesto a un proceso en marcha.
+    `index` es un kb_local_index.LocalIndex opcional: se reindexan solo los
+    archivos tocados (leídos de `root`) y se quitan los que ya no existen.
+    `graph` (kb_graph.KbGraph opcional) se actualiza con los mismos archivos.
+    `state_backend` es el estado del Store del manifiesto
+    (get_state_backend(alias=...)), que se relee si llega fuera de secuencia;
+    sin él se usa el del destino default.
+    """
+    result = {"invalidated": 0, "reindexed": 0}
+    updated = {
+        p: entry["hash"]
+        for p, entry in {**manifest.get("added", {}), **manifest.get("changed", {})}.items()
+    }
+    removed = manifest.get("removed", [])
+
+    if cache is not None:
+        if cache.version != manifest.get("previous_version"):
+            logger.warning(f"⚠️ Manifiesto fuera de secuencia (cache v{cache.version}, "
+                           f"esperado v{manifest.get('previous_version')}): recargando estado completo")
+            result["invalidated"] = cache.refresh_from_state_file(backend=state_backend)["invalidated"]
+        else:
+            result["invalidated"] = cache.apply_changes(updated, removed)["invalidated"]
+
+    if index is not None or graph is not None:
+        touched = manifest_paths(manifest)
+        present = {p: sha256_text((root / p).read_text(encoding="utf-8", errors="ignore"))
+                   for p in touched if (root / p).exists()}
+        missing = [p for p in touched if p not in present]
+        if index is not None:
+            result["reindexed"] = index.apply(present, missing, root)
+        if graph is not None:
+            graph.apply(present, missing, root)
+
+    logger.info(f"🔁 KB v{manifest.get('kb_version')} aplicada en caliente: "
+                f"{len(manifest_paths(manifest))} paths, {result['invalidated']} entradas invalidadas, "
+                f"{result['reindexed']} reindexados")
+    return result
+
+
+class ManifestWatcher:
+    """
+    Vigila el archivo de manifiesto y lo aplica al detectar una versión nueva.
+    `alias` elige el Store destino (kb_stores.py): su manifiesto y su estado
+    para el fallback. `path` / `state_backend` permiten fijarlos a mano.
+    """
+
+    def __init__(self, cache: Optional[QueryCache] = None, index=None,
+                 path: Optional[Path] = None, poll_seconds: float = POLL_SECONDS, graph=None,
+                 alias: Optional[str] = None, state_backend=None):
+        self.cache = cache
+        self.index = index
+        self.graph = graph
+        self.path = Path(path) if path is not None else manifest_file_for(alias)
+        self.state_backend = state_backend if state_backend is not None else get_state_backend(alias=alias)
+        self.poll_seconds = poll_seconds
+        self.applied_version: Optional[str] = cache.version if cache is not None else None
+        self._mtime: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def check(self) -> bool:
+        """Aplica el manifiesto si cambió desde la última vez. Devuelve True si aplicó algo."""
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        manifest = read_manifest(self.path)
+        if not manifest or manifest.get("kb_version") == self.applied_version:
+            return False
+        apply_manifest(manifest, self.cache, self.index, graph=self.graph, state_backend=self.state_backend)
+        self.applied_version = manifest.get("kb_version")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning(f"⚠️ Error aplicando manifiesto: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="kb-manifest-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
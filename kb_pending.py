@@ -0,0 +1,216 @@
+"""
+Subidas pendientes: operaciones aceptadas por la API cuyo document_id aún
+no está en sync_state.json.
+
+Un documento en STATE_PENDING (indexando) no aparece en el listado del Store
+(ver diagnose_api.py). Si la operación no termina dentro del run, antes se
+buscaba el documento en el listado hasta fallar, el run abortaba sin guardar
+y el siguiente volvía a subir un documento que solo estaba indexando
+(duplicado + ráfagas de listados).
+
+Ahora el sync anota cada operación en cuanto la API acepta la subida: una
+línea por subida en sync_pending.json.journal (append + fsync), que al
+guardar se compacta en sync_pending.json (escritura atómica). Ambos van
+junto al estado en Git:
+
+{
+  "fileSearchStores/.../upload/operations/abc": {
+    "key": "kb/x.md#seccion", "path": "kb/x.md", "chunk": "seccion",
+    "hash": "...", "body_hash": "...", "meta_hash": "...",
+    "store_name": "fileSearchStores/...", "accepted_at": "2025-12-21T10:00:00+00:00"
+  }
+}
+
+Al empezar cada run (y en cada lote del modo watch) el reconciliador del
+sync consulta esas operaciones por nombre:
+- terminada con documento → entra al estado (o se borra si quedó obsoleta
+  o duplicada)
+- terminada con error → se descarta y la unidad se vuelve a subir
+- sigue indexando → se mantiene; la unidad NO se vuelve a subir mientras su
+  hash no cambie
+- más antigua que KB_PENDING_MAX_AGE_HOURS (default 24) → se descarta
+
+Cada destino de KB_STORE_TARGETS tiene su archivo:
+- default → sync_pending.json
+- otros   → sync_pending.<alias>.json
+"""
+
+import os
+import json
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from kb_state import DEFAULT_ALIAS
+
+logger = logging.getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parent
+PENDING_FILE = ROOT / "sync_pending.json"  # ← Persistente en Git (junto a sync_state.json)
+PENDING_MAX_AGE_HOURS = float(os.getenv("KB_PENDING_MAX_AGE_HOURS", "24"))
+
+
+class UploadPending(Exception):
+    """La API aceptó la subida pero el documento sigue indexando (se resuelve en otro run)"""
+
+
+def pending_file_for(alias: Optional[str] = None) -> Path:
+    """Pendientes de un Store destino: sync_pending.<alias>.json (default → PENDING_FILE)"""
+    if not alias or alias == DEFAULT_ALIAS:
+        return PENDING_FILE
+    return PENDING_FILE.with_name(f"{PENDING_FILE.stem}.{alias}{PENDING_FILE.suffix}")
+
+
+def record_entry(record: dict, store_doc_id: str) -> dict:
+    """Entrada de sync_state.json para una subida pendiente ya resuelta"""
+    return {
+        "hash": record.get("hash"),
+        "body_hash": record.get("body_hash"),
+        "meta_hash": record.get("meta_hash"),
+        "store_doc_id": store_doc_id,
+    }
+
+
+def is_expired(record: dict, max_age_hours: float = PENDING_MAX_AGE_HOURS) -> bool:
+    """True si la subida se aceptó hace más de `max_age_hours`"""
+    try:
+        accepted_at = datetime.fromisoformat(record["accepted_at"])
+    except (KeyError, TypeError, ValueError):
+        return True
+    return datetime.now(timezone.utc) - accepted_at > timedelta(hours=max_age_hours)
+
+
+class PendingUploads:
+    """
+    Conjunto persistente de subidas pendientes ({nombre de operación -> registro}).
+
+    add() y supersede() añaden una línea (fsync) a un journal
+    (sync_pending.json.journal): O(1) por subida, sin reescribir el archivo.
+    resolve() solo marca en memoria; save() compacta: quita las resueltas,
+    reescribe sync_pending.json una vez y vacía el journal. Así una operación
+    resuelta no se pierde si el run cae antes de guardar el estado: el
+    siguiente run la vuelve a resolver. Thread-safe (subidas en paralelo).
+    """
+
+    def __init__(self, path: Path = PENDING_FILE):
+        self.path = Path(path)
+        self.journal_path = self.path.with_suffix(self.path.suffix + ".journal")
+        self._lock = threading.Lock()
+        self._journal = None
+        self._dirty = False  # el journal tiene entradas sin compactar
+        self._records: Dict[str, dict] = self._load()
+        self._resolved = set()
+
+    def _load(self) -> Dict[str, dict]:
+        records: Dict[str, dict] = {}
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8") or "{}")
+                records = data if isinstance(data, dict) else {}
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo leer {self.path.name}: {e}")
+        if self.journal_path.exists():
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # línea cortada por un corte del proceso
+                    if entry.get("op") == "add":
+                        records[entry["name"]] = entry["record"]
+                        self._dirty = True
+                    elif entry.get("op") == "supersede" and entry.get("name") in records:
+                        records[entry["name"]]["superseded"] = True
+                        self._dirty = True
+        return records
+
+    def _append(self, entry: dict):
+        """Añade una línea al journal y la lleva a disco; llamar con el lock tomado"""
+        if self._journal is None:
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._journal.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._dirty = True
+
+    def _compact(self):
+        """Reescribe sync_pending.json (tmp + rename) y vacía el journal; llamar con el lock tomado"""
+        if self._records or self.path.exists():
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(json.dumps(self._records, indent=2, ensure_ascii=False, sort_keys=True), encoding="utf-8")
+            os.replace(tmp, self.path)
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self.journal_path.exists():
+            # Vacío (no borrado): sigue existiendo para que el commit de CI lo incluya
+            self.journal_path.write_text("")
+        self._dirty = False
+
+    def files(self) -> List[Path]:
+        """Archivos de las pendientes que existen en disco (para commitearlos con el estado)"""
+        return [p for p in (self.path, self.journal_path) if p.exists()]
+
+    def add(self, operation_name: str, unit, store_name: str):
+        """Anota una subida aceptada (`unit` es un DocUnit) y la lleva a disco en el momento"""
+        record = {
+            "key": unit.key,
+            "path": unit.kb_path,
+            "chunk": unit.anchor,
+            "hash": unit.hash,
+            "body_hash": unit.body_hash,
+            "meta_hash": unit.meta_hash,
+            "store_name": store_name,
+            "accepted_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        with self._lock:
+            self._records[operation_name] = record
+            self._resolved.discard(operation_name)
+            self._append({"op": "add", "name": operation_name, "record": record})
+
+    def resolve(self, operation_name: str):
+        """Marca la operación como resuelta (se quita del archivo en save())"""
+        with self._lock:
+            if operation_name in self._records:
+                self._resolved.add(operation_name)
+
+    def supersede(self, key: str):
+        """Hay una versión nueva de `key` en camino: sus pendientes ya no deben entrar al estado"""
+        with self._lock:
+            for operation_name, record in self._records.items():
+                if record.get("key") == key and operation_name not in self._resolved and not record.get("superseded"):
+                    record["superseded"] = True
+                    self._append({"op": "supersede", "name": operation_name})
+
+    def unresolved(self) -> Dict[str, dict]:
+        """{operación -> registro} aún sin resolver"""
+        with self._lock:
+            return {name: dict(record) for name, record in self._records.items() if name not in self._resolved}
+
+    def pending_hashes(self) -> Dict[str, str]:
+        """{clave -> hash} de las subidas en curso que sí deben entrar al estado"""
+        return {record["key"]: record.get("hash") for record in self.unresolved().values()
+                if not record.get("superseded")}
+
+    def save(self):
+        """Compacta: quita las resueltas y vacía el journal (llamar después de guardar el estado)"""
+        with self._lock:
+            if not self._resolved and not self._dirty:
+                return
+            for operation_name in self._resolved:
+                self._records.pop(operation_name, None)
+            self._resolved.clear()
+            self._compact()
+
+    def clear(self):
+        """Descarta todas las pendientes (reset del Store)"""
+        with self._lock:
+            self._records.clear()
+            self._resolved.clear()
+            self._compact()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._records) - len(self._resolved)
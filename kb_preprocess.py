@@ -0,0 +1,148 @@
+"""
+Preprocesado local de Markdown antes de subir al File Search Store.
+
+Pipeline por archivo:
+1. Frontmatter → metadata (el cuerpo se sube sin el bloque YAML)
+2. Normalización de whitespace (CRLF, espacios finales, líneas en blanco
+   repetidas, NFC) para que ediciones cosméticas no cambien el hash
+3. Docs grandes (> KB_SPLIT_MIN_BYTES) se parten en los headings "## "
+   en unidades por sección, cada una con su propio hash
+
+Cada unidad es un documento del Store con su propia entrada en
+sync_state.json:
+- Doc sin partir → clave "kb/path.md"
+- Sección        → clave "kb/path.md#anchor" (metadata "chunk" = anchor)
+Editar una sección re-sube solo esa sección.
+
+Hash semántico (dos huellas por unidad):
+- body_hash → texto normalizado que se sube
+- meta_hash → solo los campos del frontmatter de KB_REUPLOAD_META_KEYS
+  (default: todos los de build_metadata + keywords, menos last_review y
+  last_updated)
+- hash      → sha256(body_hash:meta_hash), el que decide si se re-sube
+Un bump de last_review no cambia el hash: no hay delete + reindex.
+"""
+
+import os
+import re
+import json
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from kb_docs import sha256_text, parse_frontmatter, build_metadata, KEYS_TO_TAKE
+
+SPLIT_MIN_BYTES = int(os.getenv("KB_SPLIT_MIN_BYTES", "4000"))
+SPLIT_HEADING = "## "
+
+# Campos del frontmatter que disparan re-subida (el resto solo viaja como metadata)
+_DEFAULT_REUPLOAD_META_KEYS = [k for k in KEYS_TO_TAKE + ["keywords"] if k not in ("last_review", "last_updated")]
+REUPLOAD_META_KEYS = [
+    k.strip() for k in os.getenv("KB_REUPLOAD_META_KEYS", ",".join(_DEFAULT_REUPLOAD_META_KEYS)).split(",")
+    if k.strip()
+]
+
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_SLUG_RE = re.compile(r"[^\w]+", re.UNICODE)
+
+
+@dataclass
+class DocUnit:
+    """Unidad subible: un doc completo o una sección de un doc grande"""
+    key: str              # clave en sync_state.json
+    kb_path: str          # archivo de origen
+    anchor: Optional[str]  # None si es el doc completo
+    text: str             # Markdown normalizado que se sube
+    hash: str             # sha256(body_hash:meta_hash)
+    body_hash: str = ""
+    meta_hash: str = ""
+    fm: Dict = field(default_factory=dict)
+
+
+def unit_path(key: str) -> str:
+    """Path del archivo de una clave de unidad ("kb/x.md#sec" → "kb/x.md")"""
+    return key.split("#", 1)[0]
+
+
+def normalize_markdown(text: str) -> str:
+    """Normaliza whitespace sin tocar el contenido de bloques de código"""
+    text = unicodedata.normalize("NFC", text.replace("\r\n", "\n").replace("\r", "\n"))
+    out: List[str] = []
+    in_fence = False
+    blank = False
+    for line in text.split("\n"):
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+        line = line.rstrip()
+        if not line and not in_fence:
+            if blank or not out:
+                continue
+            blank = True
+        else:
+            blank = False
+        out.append(line)
+    while out and not out[-1]:
+        out.pop()
+    return "\n".join(out) + "\n"
+
+
+def slugify(heading: str) -> str:
+    slug = _SLUG_RE.sub("-", heading.strip().lower()).strip("-")
+    return slug or "section"
+
+
+def split_sections(body: str) -> List[Tuple[str, str]]:
+    """Parte en headings "## " (fuera de bloques de código) → [(heading, texto)]"""
+    sections: List[Tuple[str, List[str]]] = [("", [])]
+    in_fence = False
+    for line in body.split("\n"):
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+        if not in_fence and line.startswith(SPLIT_HEADING):
+            sections.append((line[len(SPLIT_HEADING):].strip(), []))
+        sections[-1][1].append(line)
+    return [(h, "\n".join(lines).strip("\n") + "\n") for h, lines in sections if "".join(lines).strip()]
+
+
+def unit_metadata(unit: DocUnit) -> List[Dict]:
+    """Metadata del Store para una unidad (la del doc + "chunk" si es una sección)"""
+    section = unit.kb_path.split("/", 1)[1].split("/", 1)[0]
+    meta = build_metadata(unit.kb_path, section, unit.hash, unit.fm)
+    if unit.anchor:
+        meta.append({"key": "chunk", "string_value": unit.anchor})
+    return meta
+
+
+def metadata_fingerprint(fm: Dict, keys: List[str] = REUPLOAD_META_KEYS) -> str:
+    """Representación canónica de los campos del frontmatter que disparan re-subida"""
+    relevant = {k: fm[k] for k in keys if fm.get(k) is not None}
+    return json.dumps(relevant, sort_keys=True, default=str, ensure_ascii=False)
+
+
+def _make_unit(key: str, kb_path: str, anchor: Optional[str], text: str, meta_hash: str, fm: Dict) -> DocUnit:
+    body_hash = sha256_text(text)
+    return DocUnit(key, kb_path, anchor, text, sha256_text(f"{body_hash}:{meta_hash}"), body_hash, meta_hash, fm)
+
+
+def prepare_document(kb_path: str, md_text: str, split_min_bytes: int = SPLIT_MIN_BYTES) -> Tuple[Dict, List[DocUnit]]:
+    """Devuelve (frontmatter, unidades) listas para subir"""
+    fm, body = parse_frontmatter(md_text)
+    body = normalize_markdown(body)
+    meta_hash = sha256_text(metadata_fingerprint(fm))
+
+    sections = split_sections(body) if len(body.encode("utf-8")) > split_min_bytes else []
+    if len(sections) < 2:
+        return fm, [_make_unit(kb_path, kb_path, None, body, meta_hash, fm)]
+
+    # Cada sección lleva el título del doc como contexto para el retrieval
+    title = str(fm.get("title") or kb_path)
+    units = []
+    seen: Dict[str, int] = {}
+    for heading, text in sections:
+        anchor = slugify(heading) if heading else "intro"
+        seen[anchor] = seen.get(anchor, 0) + 1
+        if seen[anchor] > 1:
+            anchor = f"{anchor}-{seen[anchor]}"
+        unit_text = f"# {title}\n\n{text}"
+        units.append(_make_unit(f"{kb_path}#{anchor}", kb_path, anchor, unit_text, meta_hash, fm))
+    return fm, units
@@ -0,0 +1,277 @@
+"""
+Profiling opcional de los scripts (sync, audit, reset, diagnose).
+
+Se activa con KB_PROFILE (apagado por defecto, sin coste si no se usa):
+- KB_PROFILE=sampling → muestreo de stacks de TODOS los hilos cada
+  KB_PROFILE_INTERVAL_MS (default 5 ms), sin dependencias. Captura también
+  las esperas (time.sleep del polling, sockets de la API). Recomendado para
+  el sync, que sube desde un pool de hilos.
+- KB_PROFILE=cprofile → cProfile determinista (solo el hilo principal)
+
+En ambos modos tracemalloc mide el pico de memoria y las líneas que más
+asignan en cada etapa del pipeline (profiler.stage("...")).
+
+Salida en KB_PROFILE_DIR (default profiles/<script>-<timestamp>/):
+- report.json    → etapas: tiempo de reloj, CPU, pico de memoria, top allocs
+- stacks.folded  → (sampling) stacks colapsados "a;b;c N", compatibles con
+                   flamegraph.pl, speedscope e inferno
+- profile.prof   → (cprofile) pstats, para snakeviz / flameprof / gprof2dot
+
+Uso:
+    KB_PROFILE=sampling python sync_kb_to_store.py
+    flamegraph.pl profiles/sync_kb_to_store-*/stacks.folded > sync.svg
+
+En el código:
+    from kb_profile import profiler
+    with profiler.run("sync_kb_to_store"):
+        with profiler.stage("preprocess"):
+            ...
+Scripts lineales (sin main) usan profiler.start() + profiler.checkpoint().
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import pstats
+import logging
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parent
+MODE_SAMPLING = "sampling"
+MODE_CPROFILE = "cprofile"
+MODES = (MODE_SAMPLING, MODE_CPROFILE)
+
+TOP_ALLOCATIONS = 10
+TRACEMALLOC_FRAMES = 1
+
+
+def _profile_mode() -> Optional[str]:
+    mode = os.getenv("KB_PROFILE", "").strip().lower()
+    if mode in ("", "0", "false", "off"):
+        return None
+    if mode in ("1", "true", "on"):
+        return MODE_SAMPLING
+    if mode not in MODES:
+        logger.warning(f"⚠️ KB_PROFILE desconocido '{mode}', usando '{MODE_SAMPLING}'")
+        return MODE_SAMPLING
+    return mode
+
+
+class StackSampler:
+    """Muestrea los stacks de todos los hilos (sys._current_frames) en un hilo daemon"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="kb-profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write_folded(self, path: Path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class _Stage:
+    __slots__ = ("name", "thread", "wall_start", "cpu_start", "peak")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.thread = threading.current_thread().name
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.peak = 0
+
+
+class Profiler:
+    """Sesión de profiling del proceso (una por script)"""
+
+    def __init__(self):
+        self.mode: Optional[str] = None
+        self.script: Optional[str] = None
+        self.out_dir: Optional[Path] = None
+        self.stages: List[Dict] = []
+        self._started_at = None
+        self._wall_start = 0.0
+        self._sampler: Optional[StackSampler] = None
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._checkpoint = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode is not None
+
+    def start(self, script: str, mode: Optional[str] = None) -> bool:
+        """Arranca el profiling si KB_PROFILE lo pide; se cierra solo al salir del proceso"""
+        if self.enabled:
+            return True
+        self.mode = mode or _profile_mode()
+        if not self.enabled:
+            return False
+        self.script = script
+        self._started_at = datetime.now()
+        base = Path(os.getenv("KB_PROFILE_DIR", str(ROOT / "profiles")))
+        self.out_dir = base / f"{script}-{self._started_at:%Y%m%d-%H%M%S}"
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        if self.mode == MODE_SAMPLING:
+            interval = float(os.getenv("KB_PROFILE_INTERVAL_MS", "5")) / 1000
+            self._sampler = StackSampler(interval)
+            self._sampler.start()
+        else:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self._wall_start = time.perf_counter()
+        atexit.register(self.stop)
+        logger.info(f"🔬 Profiling activo ({self.mode}) → {self.out_dir}")
+        return True
+
+    @contextmanager
+    def run(self, script: str):
+        """Envuelve el main de un script: start() al entrar, stop() al salir (también con error)"""
+        self.start(script)
+        try:
+            yield self
+        finally:
+            self.stop()
+
+    def _stack(self) -> List[_Stage]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def stage(self, name: str):
+        """Etapa del pipeline: tiempo de reloj, CPU del proceso y pico de memoria (tracemalloc)"""
+        if not self.enabled:
+            yield
+            return
+        # tracemalloc es global al proceso: con etapas en paralelo (un hilo por
+        # Store) el pico de cada una incluye lo asignado por las demás
+        stack = self._stack()
+        if stack:
+            # El pico acumulado hasta aquí pertenece a la etapa padre
+            stack[-1].peak = max(stack[-1].peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        current = _Stage("/".join([s.name for s in stack] + [name]))
+        stack.append(current)
+        try:
+            yield
+        finally:
+            stack.pop()
+            current.peak = max(current.peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, current.peak)
+            self._record(current)
+
+    def checkpoint(self, name: str):
+        """Para scripts lineales: cierra la etapa anterior de checkpoint y abre `name`"""
+        if not self.enabled:
+            return
+        if self._checkpoint is not None:
+            self._checkpoint.__exit__(None, None, None)
+        self._checkpoint = self.stage(name)
+        self._checkpoint.__enter__()
+
+    def _record(self, stage: _Stage):
+        top = []
+        try:
+            stats = tracemalloc.take_snapshot().statistics("lineno")[:TOP_ALLOCATIONS]
+            top = [{"where": str(s.traceback[0]), "size_kb": round(s.size / 1024, 1), "count": s.count}
+                   for s in stats]
+        except Exception:
+            pass
+        with self._lock:
+            self.stages.append({
+                "stage": stage.name,
+                "thread": stage.thread,
+                "wall_seconds": round(time.perf_counter() - stage.wall_start, 4),
+                "cpu_seconds": round(time.process_time() - stage.cpu_start, 4),
+                "peak_bytes": stage.peak,
+                "top_allocations": top,
+            })
+
+    def stop(self):
+        """Detiene el profiling y escribe report.json + stacks.folded / profile.prof"""
+        if not self.enabled:
+            return
+        if self._checkpoint is not None:
+            self._checkpoint.__exit__(None, None, None)
+            self._checkpoint = None
+        wall = time.perf_counter() - self._wall_start
+        files = ["report.json"]
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler.write_folded(self.out_dir / "stacks.folded")
+            files.append("stacks.folded")
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(str(self.out_dir / "profile.prof"))
+            files.append("profile.prof")
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        report = {
+            "script": self.script,
+            "mode": self.mode,
+            "started_at": self._started_at.isoformat(timespec="seconds"),
+            "wall_seconds": round(wall, 4),
+            "peak_bytes": peak,
+            "stages": self.stages,
+        }
+        if self._cprofile is not None:
+            stats = pstats.Stats(self._cprofile)
+            top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:20]
+            report["top_functions"] = [
+                {"function": f"{func} ({Path(file).name}:{line})", "calls": nc, "cumulative_seconds": round(ct, 4)}
+                for (file, line, func), (_, nc, _, ct, _) in top
+            ]
+        (self.out_dir / "report.json").write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+        logger.info(f"\n🔬 PROFILING ({self.mode}) — {wall:.2f}s total")
+        for s in self.stages:
+            logger.info(f"   {s['stage']:<40} {s['wall_seconds']:>8.2f}s  cpu {s['cpu_seconds']:>7.2f}s  "
+                        f"pico {s['peak_bytes'] / 1024 / 1024:>7.1f} MiB")
+        logger.info(f"   → {self.out_dir} ({', '.join(files)})")
+        self.mode = None
+        atexit.unregister(self.stop)
+
+
+profiler = Profiler()
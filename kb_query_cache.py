@@ -0,0 +1,199 @@
+"""
+Cache de respuestas del bot, versionada por el estado del KB.
+
+Clave: pregunta normalizada + versión del KB (derivada de los hashes de
+sync_state.json). Cada entrada recuerda los paths del KB que la respaldan
+(grounding del File Search).
+
+Tras un sync, apply_kb_state() compara los hashes nuevos con los anteriores:
+- Entradas cuyos paths fuente cambiaron (o se borraron) → se invalidan
+- El resto → se re-indexan con la nueva versión y siguen sirviendo
+Así las preguntas populares se siguen respondiendo desde cache y el bot no
+necesita reiniciarse para soltar respuestas obsoletas.
+
+Evicción LRU acotada por número de entradas y por tamaño aproximado en bytes.
+
+Uso desde el bot:
+    from kb_query_cache import QueryCache
+    cache = QueryCache.from_state_file()
+    answer = cache.get(question)
+    if answer is None:
+        answer, paths = ask_store(question)
+        cache.put(question, answer, paths)
+    ...
+    cache.refresh_from_state_file()   # tras cada sync (o kb_manifest.apply_manifest)
+"""
+
+import re
+import json
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Tuple
+
+from kb_preprocess import unit_path
+from kb_state import load_state
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+_PUNCT_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Minúsculas, sin acentos, sin puntuación y con espacios colapsados"""
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _PUNCT_RE.sub(" ", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def path_hashes(state: Dict[str, Any]) -> Dict[str, str]:
+    """{kb_path -> hash} desde sync_state (acepta formato antiguo de solo strings)"""
+    hashes = {}
+    for path, value in state.items():
+        if isinstance(value, str):
+            hashes[path] = value
+        elif isinstance(value, dict) and value.get("hash"):
+            hashes[path] = value["hash"]
+    return hashes
+
+
+def kb_version(hashes: Dict[str, str]) -> str:
+    """Versión compacta del KB: SHA256 de los pares path:hash ordenados"""
+    digest = hashlib.sha256()
+    for path in sorted(hashes):
+        digest.update(f"{path}:{hashes[path]}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def load_path_hashes(state_file: Optional[Path] = None, backend=None) -> Dict[str, str]:
+    """
+    Devuelve {clave -> hash} del estado del sync ({} si no existe o falla).
+    `backend` (kb_state.get_state_backend(alias=...)) lee el estado de otro
+    Store destino; sin `state_file` ni `backend` usa el de KB_STATE_BACKEND.
+    """
+    try:
+        if backend is not None:
+            return path_hashes(backend.load())
+        if state_file is None:
+            return path_hashes(load_state())
+        return path_hashes(json.loads(Path(state_file).read_text(encoding="utf-8")) or {})
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo leer el estado del sync: {e}")
+        return {}
+
+
+class QueryCache:
+    """Cache LRU de respuestas, thread-safe, con invalidación por path fuente"""
+
+    def __init__(self, hashes: Optional[Dict[str, str]] = None,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._hashes: Dict[str, str] = dict(hashes or {})
+        self.version = kb_version(self._hashes)
+        # (pregunta normalizada, versión) -> (respuesta, paths fuente, tamaño)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, FrozenSet[str], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0, "invalidated": 0}
+
+    @classmethod
+    def from_state_file(cls, state_file: Optional[Path] = None, backend=None, **kwargs) -> "QueryCache":
+        return cls(load_path_hashes(state_file, backend), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, question: str) -> Optional[Any]:
+        key = (normalize_question(question), self.version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def put(self, question: str, answer: Any, source_paths: Iterable[str] = ()):
+        """
+        Guarda una respuesta. `source_paths` son los kb_path que la respaldan;
+        sin paths la entrada se invalida ante cualquier cambio del KB.
+        """
+        sources = frozenset(source_paths)
+        size = len(str(answer).encode("utf-8", errors="ignore"))
+        if size > self.max_bytes:
+            return
+        key = (normalize_question(question), self.version)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (answer, sources, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.stats["evicted"] += 1
+
+    def invalidate_paths(self, paths: Iterable[str]) -> int:
+        """Invalida las entradas respaldadas por alguno de `paths`"""
+        paths = set(paths)
+        with self._lock:
+            return self._drop(lambda sources: not sources or bool(paths & sources))
+
+    def apply_kb_state(self, hashes: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Aplica un nuevo {kb_path -> hash}: invalida solo las entradas cuyos paths
+        fuente cambiaron y re-versiona el resto. Devuelve un resumen.
+        """
+        new_version = kb_version(hashes)
+        if new_version == self.version:
+            return {"version": self.version, "changed": 0, "invalidated": 0, "kept": len(self)}
+
+        # Las claves pueden ser secciones ("kb/x.md#sec"); las fuentes son archivos
+        changed = {unit_path(k) for k in self._hashes.keys() | hashes.keys() if self._hashes.get(k) != hashes.get(k)}
+        with self._lock:
+            invalidated = self._drop(lambda sources: not sources or bool(changed & sources))
+            self._entries = OrderedDict(
+                ((question, new_version), entry) for (question, _), entry in self._entries.items()
+            )
+            self._hashes = dict(hashes)
+            self.version = new_version
+            kept = len(self._entries)
+
+        logger.info(f"🧠 Cache KB v{new_version}: {len(changed)} archivos cambiados, "
+                    f"{invalidated} entradas invalidadas, {kept} conservadas")
+        return {"version": new_version, "changed": len(changed), "invalidated": invalidated, "kept": kept}
+
+    def apply_changes(self, updated: Dict[str, str], removed: Iterable[str] = ()) -> Dict[str, Any]:
+        """Aplica un diff parcial ({kb_path -> hash nuevo}, paths borrados) sin releer el estado"""
+        hashes = dict(self._hashes)
+        hashes.update(updated)
+        for kb_path in removed:
+            hashes.pop(kb_path, None)
+        return self.apply_kb_state(hashes)
+
+    def refresh_from_state_file(self, state_file: Optional[Path] = None, backend=None) -> Dict[str, Any]:
+        """Relee el estado del sync y aplica el diff (no-op si la versión no cambió)"""
+        return self.apply_kb_state(load_path_hashes(state_file, backend))
+
+    def _drop(self, predicate) -> int:
+        """Borra entradas cuyos paths fuente cumplen `predicate` (requiere el lock)"""
+        doomed = [key for key, (_, sources, _) in self._entries.items() if predicate(sources)]
+        for key in doomed:
+            _, _, size = self._entries.pop(key)
+            self._bytes -= size
+        self.stats["invalidated"] += len(doomed)
+        return len(doomed)
@@ -0,0 +1,115 @@
+"""
+Planificación de subidas por tamaño para el sync.
+
+Orden (KB_UPLOAD_ORDER):
+- largest  → grandes primero: minimiza el makespan con subidas concurrentes
+             (default; un archivo enorme no queda al final bloqueando el run)
+- smallest → pequeños primero: máxima cobertura del KB cuanto antes
+- path     → orden alfabético (comportamiento histórico)
+
+Lotes: las unidades de hasta KB_UPLOAD_BATCH_MAX_BYTES se agrupan de a
+KB_UPLOAD_BATCH_SIZE. La API no tiene subida multi-documento y cada doc del
+Store lleva su propia metadata (path, chunk), así que un lote no fusiona
+documentos: se envían todas sus subidas seguidas y se espera a sus
+operaciones juntas (una ronda de polling por lote, no una por doc).
+
+Presupuesto de bytes en vuelo (KB_UPLOAD_MAX_INFLIGHT_BYTES, default 16 MiB):
+compartido por todos los Stores del proceso, acota el ancho de banda de
+subida cuando hay varios syncs concurrentes. No acota la memoria: el sync
+preprocesa todo el KB antes de subir, así que el texto de cada unidad ya está
+cargado. Una unidad más grande que el presupuesto se sube sola.
+"""
+
+import os
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Iterable, List
+
+from kb_preprocess import DocUnit
+
+logger = logging.getLogger(__name__)
+
+ORDER_LARGEST = "largest"
+ORDER_SMALLEST = "smallest"
+ORDER_PATH = "path"
+ORDERS = (ORDER_LARGEST, ORDER_SMALLEST, ORDER_PATH)
+
+UPLOAD_ORDER = os.getenv("KB_UPLOAD_ORDER", ORDER_LARGEST).strip().lower()
+BATCH_MAX_BYTES = int(os.getenv("KB_UPLOAD_BATCH_MAX_BYTES", "4096"))
+BATCH_SIZE = int(os.getenv("KB_UPLOAD_BATCH_SIZE", "8"))
+MAX_INFLIGHT_BYTES = int(os.getenv("KB_UPLOAD_MAX_INFLIGHT_BYTES", str(16 * 1024 * 1024)))
+
+
+def unit_cost(unit: DocUnit) -> int:
+    """Coste estimado de subir una unidad: bytes del texto"""
+    return len(unit.text.encode("utf-8"))
+
+
+def order_units(units: Iterable[DocUnit], policy: str = UPLOAD_ORDER) -> List[DocUnit]:
+    """Ordena las unidades según la política (desempate por clave, determinista)"""
+    units = sorted(units, key=lambda u: u.key)
+    if policy == ORDER_PATH:
+        return units
+    if policy == ORDER_SMALLEST:
+        return sorted(units, key=unit_cost)
+    if policy != ORDER_LARGEST:
+        logger.warning(f"⚠️ KB_UPLOAD_ORDER desconocido '{policy}', usando '{ORDER_LARGEST}'")
+    return sorted(units, key=unit_cost, reverse=True)
+
+
+def plan_batches(units: Iterable[DocUnit], policy: str = UPLOAD_ORDER, batch_max_bytes: int = BATCH_MAX_BYTES,
+                 batch_size: int = BATCH_SIZE) -> List[List[DocUnit]]:
+    """
+    Lotes en orden de ejecución: cada unidad grande va sola; las pequeñas
+    consecutivas (en el orden de la política) se agrupan.
+    """
+    batches: List[List[DocUnit]] = []
+    small: List[DocUnit] = []
+    for unit in order_units(units, policy):
+        if unit_cost(unit) > batch_max_bytes or batch_size <= 1:
+            if small:
+                batches.append(small)
+                small = []
+            batches.append([unit])
+            continue
+        small.append(unit)
+        if len(small) >= batch_size:
+            batches.append(small)
+            small = []
+    if small:
+        batches.append(small)
+    return batches
+
+
+class ByteBudget:
+    """Semáforo por bytes: bloquea mientras lo que hay en vuelo + lo pedido supere el máximo"""
+
+    def __init__(self, max_bytes: int = MAX_INFLIGHT_BYTES):
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, n: int):
+        with self._cond:
+            # Si no hay nada en vuelo se deja pasar aunque n supere el máximo
+            while self.in_flight > 0 and self.in_flight + n > self.max_bytes:
+                self._cond.wait()
+            self.in_flight += n
+
+    def release(self, n: int):
+        with self._cond:
+            self.in_flight -= n
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self, n: int):
+        self.acquire(n)
+        try:
+            yield
+        finally:
+            self.release(n)
+
+
+# Compartido por todos los Stores del proceso (fan_out corre un hilo por Store)
+UPLOAD_BUDGET = ByteBudget()
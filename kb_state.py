@@ -0,0 +1,331 @@
+"""
+Backends de estado del sync (clave → {"hash", "body_hash", "meta_hash", "store_doc_id"}).
+
+KB_STATE_BACKEND en .env:
+- json   → sync_state.json (default, formato histórico, legible en Git)
+- sqlite → sync_state.sqlite, compacto:
+    * hashes como digest crudo de 32 bytes (no 64 caracteres hex)
+    * prefijo del store_doc_id ("fileSearchStores/<store>/documents/")
+      internado en una tabla aparte; cada fila guarda solo el sufijo
+    * carga perezosa: las filas se leen cuando se piden
+    * escrituras O(cambios): save() solo toca filas distintas
+
+Ambos backends devuelven un MutableMapping, así el sync no distingue cuál usa.
+
+CLI (migración / compatibilidad):
+    python kb_state.py export [salida.json]   # sqlite → JSON
+    python kb_state.py import [entrada.json]  # JSON → sqlite
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import logging
+import threading
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parent
+STATE_FILE = ROOT / "sync_state.json"  # ← Archivo persistente en Git
+STATE_BASE_FILE = ROOT / "sync_state_base.json"  # ← Template base (vacío)
+STATE_DB_FILE = ROOT / "sync_state.sqlite"
+
+DEFAULT_ALIAS = "default"  # destino único / principal (ver kb_stores.py)
+
+BACKEND_JSON = "json"
+BACKEND_SQLITE = "sqlite"
+
+HASH_FIELDS = ("hash", "body_hash", "meta_hash")
+_DOCS_MARKER = "/documents/"
+
+
+def _normalize_entries(data: dict) -> Dict[str, dict]:
+    """Convierte el formato antiguo (solo strings) al nuevo (dicts)"""
+    new_format = {}
+    for path, value in data.items():
+        if isinstance(value, str):
+            # Formato antiguo: solo el hash
+            new_format[path] = {
+                "hash": value,
+                "store_doc_id": None,  # No lo tenemos del formato anterior
+            }
+        else:
+            # Formato nuevo: ya es un dict
+            new_format[path] = value
+    return new_format
+
+
+class JsonStateBackend:
+    """sync_state.json completo en memoria (formato histórico)"""
+
+    name = BACKEND_JSON
+
+    def __init__(self, path: Path = STATE_FILE, base_path: Path = STATE_BASE_FILE):
+        self.path = Path(path)
+        self.base_path = Path(base_path)
+
+    def load(self) -> Dict[str, dict]:
+        """
+        Compatible con versión antigua que solo tenía hashes (strings).
+
+        En GitHub Actions (primera ejecución):
+        - Si sync_state.json está vacío o no existe
+        - Usa sync_state_base.json como base (también vacío)
+        """
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text())
+
+                # Si el archivo está vacío o es un dict vacío
+                if not data:
+                    logger.info(f"📝 Primer run detectado - usando template base")
+                    if self.base_path.exists():
+                        data = json.loads(self.base_path.read_text())
+
+                return _normalize_entries(data)
+
+            except Exception as e:
+                logger.warning(f"⚠️ Error loading {self.path.name}: {e}")
+                return {}
+        logger.info(f"📝 Primer run: sin estado anterior (archivo no existe)")
+        return {}
+
+    def save(self, state) -> None:
+        self.path.write_text(json.dumps(dict(state), indent=2))
+
+    def clear(self) -> None:
+        """Vacía el estado en un solo paso atómico (tmp + rename)"""
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text("{}")
+        os.replace(tmp, self.path)
+
+
+def _to_digest(value: Optional[str]):
+    """Hex de 64 caracteres → 32 bytes (otros valores se guardan tal cual)"""
+    if value is None:
+        return None
+    try:
+        digest = bytes.fromhex(value)
+        return digest if len(digest) == 32 else value
+    except (ValueError, TypeError):
+        return value
+
+
+def _from_digest(value) -> Optional[str]:
+    return value.hex() if isinstance(value, bytes) else value
+
+
+def _split_doc_id(store_doc_id: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    if not store_doc_id:
+        return None, None
+    idx = store_doc_id.find(_DOCS_MARKER)
+    if idx < 0:
+        return "", store_doc_id
+    cut = idx + len(_DOCS_MARKER)
+    return store_doc_id[:cut], store_doc_id[cut:]
+
+
+class SqliteState(MutableMapping):
+    """
+    Vista perezosa sobre sync_state.sqlite; las escrituras van directo a la DB.
+    Se comparte entre hilos (fan_out por Store, asyncio.to_thread): la
+    conexión se abre con check_same_thread=False y cada acceso toma `lock`.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.lock = threading.RLock()
+        self._cache: Dict[str, dict] = {}
+        self._prefixes: Dict[str, int] = {
+            prefix: pid for pid, prefix in conn.execute("SELECT id, prefix FROM prefixes")
+        }
+        self._prefix_by_id = {pid: prefix for prefix, pid in self._prefixes.items()}
+
+    def _prefix_id(self, prefix: Optional[str]) -> Optional[int]:
+        if prefix is None:
+            return None
+        if prefix not in self._prefixes:
+            cur = self.conn.execute("INSERT INTO prefixes (prefix) VALUES (?)", (prefix,))
+            self._prefixes[prefix] = cur.lastrowid
+            self._prefix_by_id[cur.lastrowid] = prefix
+        return self._prefixes[prefix]
+
+    def _row_to_entry(self, row) -> dict:
+        hash_, body_hash, meta_hash, prefix_id, suffix = row
+        entry = {"hash": _from_digest(hash_)}
+        if body_hash is not None:
+            entry["body_hash"] = _from_digest(body_hash)
+        if meta_hash is not None:
+            entry["meta_hash"] = _from_digest(meta_hash)
+        entry["store_doc_id"] = (self._prefix_by_id.get(prefix_id, "") + suffix) if suffix is not None else None
+        return entry
+
+    def __getitem__(self, key: str) -> dict:
+        with self.lock:
+            if key in self._cache:
+                return self._cache[key]
+            row = self.conn.execute(
+                "SELECT hash, body_hash, meta_hash, prefix_id, doc_suffix FROM units WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(key)
+            entry = self._cache[key] = self._row_to_entry(row)
+            return entry
+
+    def __setitem__(self, key: str, entry: dict):
+        prefix, suffix = _split_doc_id(entry.get("store_doc_id"))
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO units (key, hash, body_hash, meta_hash, prefix_id, doc_suffix) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, *(_to_digest(entry.get(f)) for f in HASH_FIELDS), self._prefix_id(prefix), suffix),
+            )
+            self._cache[key] = dict(entry)
+
+    def __delitem__(self, key: str):
+        with self.lock:
+            cur = self.conn.execute("DELETE FROM units WHERE key = ?", (key,))
+            self._cache.pop(key, None)
+        if cur.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key) -> bool:
+        with self.lock:
+            if key in self._cache:
+                return True
+            return self.conn.execute("SELECT 1 FROM units WHERE key = ?", (key,)).fetchone() is not None
+
+    def __iter__(self) -> Iterator[str]:
+        with self.lock:
+            return iter([row[0] for row in self.conn.execute("SELECT key FROM units ORDER BY key")])
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM units").fetchone()[0]
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def rollback(self):
+        with self.lock:
+            self.conn.rollback()
+
+    def clear(self):
+        """Borra todas las filas (sin commit, como el resto de escrituras)"""
+        with self.lock:
+            self.conn.execute("DELETE FROM units")
+            self.conn.execute("DELETE FROM prefixes")
+            self._cache.clear()
+            self._prefixes.clear()
+            self._prefix_by_id.clear()
+
+
+class SqliteStateBackend:
+    """sync_state.sqlite: digests crudos, prefijos internados, escrituras O(cambios)"""
+
+    name = BACKEND_SQLITE
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS prefixes (
+        id INTEGER PRIMARY KEY,
+        prefix TEXT UNIQUE NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS units (
+        key TEXT PRIMARY KEY,
+        hash BLOB,
+        body_hash BLOB,
+        meta_hash BLOB,
+        prefix_id INTEGER REFERENCES prefixes(id),
+        doc_suffix TEXT
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: Path = STATE_DB_FILE):
+        self.path = Path(path)
+        self._state: Optional[SqliteState] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # La vista cargada se usa desde varios hilos (ver SqliteState)
+        conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        conn.executescript(self.SCHEMA)
+        return conn
+
+    def load(self) -> SqliteState:
+        if not self.path.exists():
+            logger.info(f"📝 Primer run: sin estado anterior ({self.path.name} no existe)")
+        if self._state is None:
+            self._state = SqliteState(self._connect())
+        return self._state
+
+    def save(self, state) -> None:
+        """
+        Si `state` es la vista cargada, solo hace commit de lo ya escrito.
+        Si es un dict, escribe únicamente las filas que difieren.
+        """
+        current = self.load()
+        with current.lock:
+            if state is not current:
+                for key in [k for k in current if k not in state]:
+                    del current[key]
+                for key, entry in state.items():
+                    if key not in current or current[key] != entry:
+                        current[key] = entry
+            current.commit()
+
+    def clear(self) -> None:
+        """Vacía el estado en una sola transacción"""
+        current = self.load()
+        with current.lock:
+            try:
+                current.clear()
+                current.commit()
+            except Exception:
+                current.rollback()
+                raise
+
+
+def _alias_path(path: Path, alias: Optional[str]) -> Path:
+    """sync_state.json → sync_state.<alias>.json (el alias default no cambia el nombre)"""
+    if not alias or alias == DEFAULT_ALIAS:
+        return path
+    return path.with_name(f"{path.stem}.{alias}{path.suffix}")
+
+
+def get_state_backend(name: Optional[str] = None, alias: Optional[str] = None):
+    """
+    Backend configurado en KB_STATE_BACKEND (json | sqlite).
+    `alias` elige el estado de un Store destino (kb_stores.py).
+    """
+    name = (name or os.getenv("KB_STATE_BACKEND", BACKEND_JSON)).strip().lower()
+    if name == BACKEND_SQLITE:
+        return SqliteStateBackend(_alias_path(STATE_DB_FILE, alias))
+    if name != BACKEND_JSON:
+        logger.warning(f"⚠️ KB_STATE_BACKEND desconocido '{name}', usando '{BACKEND_JSON}'")
+    return JsonStateBackend(_alias_path(STATE_FILE, alias))
+
+
+def load_state(name: Optional[str] = None):
+    """Atajo de solo lectura para consumidores (audit, bot, cache)"""
+    return get_state_backend(name).load()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = sys.argv[1:]
+    if not args or args[0] not in ("export", "import"):
+        print(__doc__)
+        sys.exit(1)
+    json_path = Path(args[1]) if len(args) > 1 else STATE_FILE
+    if args[0] == "export":
+        state = SqliteStateBackend().load()
+        JsonStateBackend(json_path).save(state)
+        logger.info(f"📤 {len(state)} entradas exportadas a {json_path}")
+    else:
+        data = JsonStateBackend(json_path).load()
+        SqliteStateBackend().save(data)
+        logger.info(f"📥 {len(data)} entradas importadas a {STATE_DB_FILE.name}")
@@ -0,0 +1,96 @@
+"""
+Destinos del sync: un mismo KB → varios File Search Stores en un solo run.
+
+KB_STORE_TARGETS en .env (separados por coma):
+
+    KB_STORE_TARGETS=prod=fileSearchStores/aaa,staging=fileSearchStores/bbb,public=fileSearchStores/ccc?visibility=public
+
+Cada destino es `alias=store` con un filtro opcional por frontmatter
+`?clave=valor1|valor2` (varios filtros con `&`). Un doc va al Store si
+cumple todos los filtros; si el campo es una lista (ej. tags) basta con
+que uno de sus valores coincida. Un doc sin el campo no pasa el filtro.
+
+Sin KB_STORE_TARGETS se usa FILE_SEARCH_STORE_NAME como único destino
+("default"), exactamente como antes.
+
+Cada destino tiene su propio estado y manifiesto:
+- default → sync_state.json / kb_change_manifest.json / sync_pending.json
+- otros   → sync_state.<alias>.json / kb_change_manifest.<alias>.json / sync_pending.<alias>.json
+"""
+
+import os
+from dataclasses import dataclass, field
+from functools import cached_property
+from pathlib import Path
+from typing import Dict, List, Set
+
+from kb_manifest import manifest_file_for
+from kb_pending import PendingUploads, pending_file_for
+from kb_state import DEFAULT_ALIAS, get_state_backend
+
+
+@dataclass
+class StoreTarget:
+    """Un Store destino con su filtro de frontmatter"""
+    alias: str
+    store_name: str
+    match: Dict[str, Set[str]] = field(default_factory=dict)  # {} = todos los docs
+
+    def accepts(self, fm: Dict) -> bool:
+        for key, allowed in self.match.items():
+            value = fm.get(key)
+            values = value if isinstance(value, list) else [value]
+            if not any(v is not None and str(v).strip().lower() in allowed for v in values):
+                return False
+        return True
+
+    @cached_property
+    def state_backend(self):
+        """Una instancia por destino: el backend sqlite guarda sobre la vista que cargó"""
+        return get_state_backend(alias=self.alias)
+
+    @cached_property
+    def pending(self) -> PendingUploads:
+        """Subidas aceptadas aún sin document_id (kb_pending.py), una instancia por destino"""
+        return PendingUploads(pending_file_for(self.alias))
+
+    @property
+    def manifest_path(self) -> Path:
+        return manifest_file_for(self.alias)
+
+    def describe(self) -> str:
+        rules = " & ".join(f"{k}∈{{{','.join(sorted(v))}}}" for k, v in self.match.items())
+        return f"{self.alias} → {self.store_name or '(crear nuevo)'}" + (f" [{rules}]" if rules else "")
+
+
+def parse_store_targets(spec: str) -> List[StoreTarget]:
+    """Parsea KB_STORE_TARGETS (ver docstring del módulo)"""
+    targets: List[StoreTarget] = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        alias, sep, rest = item.partition("=")
+        if not sep or not alias.strip() or not rest.strip():
+            raise ValueError(f"Destino inválido en KB_STORE_TARGETS: '{item}' (formato alias=store)")
+        store_name, _, query = rest.partition("?")
+        match: Dict[str, Set[str]] = {}
+        for rule in filter(None, query.split("&")):
+            key, sep, values = rule.partition("=")
+            if not sep or not key.strip():
+                raise ValueError(f"Filtro inválido en KB_STORE_TARGETS: '{rule}' (formato clave=v1|v2)")
+            match[key.strip()] = {v.strip().lower() for v in values.split("|") if v.strip()}
+        targets.append(StoreTarget(alias.strip(), store_name.strip(), match))
+
+    aliases = [t.alias for t in targets]
+    if len(set(aliases)) != len(aliases):
+        raise ValueError(f"Alias repetidos en KB_STORE_TARGETS: {aliases}")
+    return targets
+
+
+def load_store_targets(default_store_name: str = "") -> List[StoreTarget]:
+    """Destinos configurados (KB_STORE_TARGETS o, si no hay, FILE_SEARCH_STORE_NAME)"""
+    spec = os.getenv("KB_STORE_TARGETS", "").strip()
+    if spec:
+        return parse_store_targets(spec)
+    return [StoreTarget(DEFAULT_ALIAS, default_store_name)]
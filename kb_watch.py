@@ -0,0 +1,167 @@
+"""
+Vigilancia de kb/ para el modo watch del sync (python sync_kb_to_store.py --watch).
+
+Backends:
+- watchdog (inotify en Linux, FSEvents en macOS) si está instalado:
+    pip install watchdog
+- Polling de mtime/tamaño (solo stat, sin leer ni hashear archivos) como fallback
+
+Las ráfagas de eventos (guardado de editor, git checkout, renombres) se
+agrupan con debounce: un lote se entrega cuando pasan DEBOUNCE_SECONDS sin
+eventos nuevos, o como mucho MAX_LATENCY_SECONDS después del primero.
+El callback recibe el conjunto de paths .md tocados (existan o no).
+"""
+
+import os
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Set, Tuple
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import (
+        EVENT_TYPE_CREATED, EVENT_TYPE_DELETED, EVENT_TYPE_MODIFIED, EVENT_TYPE_MOVED, FileSystemEventHandler,
+    )
+    # Solo cambios: watchdog 6 también emite opened / closed_no_write, y el
+    # propio sync lee los archivos (read_units, índice, grafo) → bucle de lotes
+    _CHANGE_EVENTS = {EVENT_TYPE_CREATED, EVENT_TYPE_DELETED, EVENT_TYPE_MODIFIED, EVENT_TYPE_MOVED}
+except ImportError:  # watchdog es opcional
+    Observer = None
+    FileSystemEventHandler = object
+    _CHANGE_EVENTS = set()
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE_SECONDS = float(os.getenv("KB_WATCH_DEBOUNCE_SECONDS", "0.3"))
+MAX_LATENCY_SECONDS = float(os.getenv("KB_WATCH_MAX_LATENCY_SECONDS", "2.0"))
+POLL_SECONDS = float(os.getenv("KB_WATCH_POLL_SECONDS", "0.5"))
+
+
+def is_kb_markdown(path: Path) -> bool:
+    return path.suffix.lower() == ".md" and path.name.lower() != "template.md"
+
+
+class ChangeCoalescer:
+    """Acumula paths tocados y los entrega en lotes con debounce"""
+
+    def __init__(self, debounce: float = DEBOUNCE_SECONDS, max_latency: float = MAX_LATENCY_SECONDS):
+        self.debounce = debounce
+        self.max_latency = max_latency
+        self._pending: Set[Path] = set()
+        self._first_at: Optional[float] = None
+        self._last_at: Optional[float] = None
+        self._cond = threading.Condition()
+
+    def add(self, path: Path):
+        if not is_kb_markdown(path):
+            return
+        with self._cond:
+            now = time.monotonic()
+            if not self._pending:
+                self._first_at = now
+            self._pending.add(path)
+            self._last_at = now
+            self._cond.notify()
+
+    def next_batch(self, stop: threading.Event) -> Set[Path]:
+        """Bloquea hasta tener un lote listo (o hasta `stop`)"""
+        with self._cond:
+            while not stop.is_set():
+                if self._pending:
+                    now = time.monotonic()
+                    quiet = now - self._last_at
+                    age = now - self._first_at
+                    if quiet >= self.debounce or age >= self.max_latency:
+                        batch, self._pending = self._pending, set()
+                        return batch
+                    self._cond.wait(min(self.debounce - quiet, self.max_latency - age))
+                else:
+                    self._cond.wait(0.5)
+        return set()
+
+
+class _WatchdogHandler(FileSystemEventHandler):
+    def __init__(self, coalescer: ChangeCoalescer):
+        self.coalescer = coalescer
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in _CHANGE_EVENTS:
+            return
+        self.coalescer.add(Path(event.src_path))
+        dest = getattr(event, "dest_path", None)
+        if dest:
+            self.coalescer.add(Path(dest))
+
+
+def _snapshot(root: Path) -> Dict[Path, Tuple[int, int]]:
+    """{path -> (mtime_ns, size)} de los .md bajo root (solo stat)"""
+    snap = {}
+    stack = [str(root)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(".md"):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    snap[Path(entry.path)] = (st.st_mtime_ns, st.st_size)
+    return snap
+
+
+def _poll_loop(root: Path, coalescer: ChangeCoalescer, stop: threading.Event, interval: float):
+    previous = _snapshot(root)
+    while not stop.wait(interval):
+        current = _snapshot(root)
+        for path in previous.keys() | current.keys():
+            if previous.get(path) != current.get(path):
+                coalescer.add(path)
+        previous = current
+
+
+def watch(root: Path, on_batch: Callable[[Set[Path]], None], stop: Optional[threading.Event] = None,
+          force_polling: bool = False):
+    """
+    Vigila `root` y llama a `on_batch(paths)` por cada lote de cambios.
+    Bloquea hasta que `stop` se activa (o Ctrl+C).
+    """
+    stop = stop or threading.Event()
+    coalescer = ChangeCoalescer()
+    observer = None
+    poller = None
+
+    if Observer is not None and not force_polling:
+        observer = Observer()
+        observer.schedule(_WatchdogHandler(coalescer), str(root), recursive=True)
+        observer.start()
+        logger.info(f"👀 Vigilando {root} (watchdog/{type(observer).__name__})")
+    else:
+        poller = threading.Thread(
+            target=_poll_loop, args=(root, coalescer, stop, POLL_SECONDS),
+            name="kb-watch-poller", daemon=True,
+        )
+        poller.start()
+        logger.info(f"👀 Vigilando {root} (polling cada {POLL_SECONDS}s; instala 'watchdog' para inotify)")
+
+    try:
+        while not stop.is_set():
+            batch = coalescer.next_batch(stop)
+            if batch:
+                on_batch(batch)
+    except KeyboardInterrupt:
+        logger.info("\n👋 Watch detenido")
+    finally:
+        stop.set()
+        if observer is not None:
+            observer.stop()
+            observer.join()
+        if poller is not None:
+            poller.join()
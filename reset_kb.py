@@ -2,15 +2,42 @@
 Script para VACIAR completamente el File Search Store.
 Úsalo manualmente cuando necesites empezar desde cero.
 
-python reset_kb.py
+python reset_kb.py [--yes] [--clear-state] [--target ALIAS]
+                   [--concurrency N] [--rate N] [--fresh]
+
+Borrado masivo:
+- El listado se recorre página a página (no se carga el Store en memoria)
+- Los borrados corren en paralelo (RESET_CONCURRENCY, default 8) bajo un
+  limitador de tasa (RESET_RATE_LIMIT borrados/s, default 10)
+- Progreso periódico con throughput y ETA (estimada con el contador de
+  documentos del Store)
+- Cada ID borrado se anota en un journal (.reset_kb.<store>.journal): si
+  el run se interrumpe, el siguiente retoma sin repetir trabajo. Un 404 al
+  borrar cuenta como borrado. --fresh ignora el journal.
+- Borrar mientras se pagina desplaza las páginas, así que se repiten
+  pasadas hasta que el listado ya no devuelve nada pendiente.
+- --clear-state vacía sync_state.json (o .sqlite) en un solo paso atómico,
+  solo si no quedó ningún documento sin borrar (y también sync_pending.json).
+
+--target elige un destino de KB_STORE_TARGETS (kb_stores.py); sin él se
+usa FILE_SEARCH_STORE_NAME.
 """
 
 import os
+import time
 import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Iterator, Optional, Set
 from dotenv import load_dotenv
 from google import genai
 
+import kb_http
+from kb_profile import profiler
+from kb_stores import StoreTarget, load_store_targets
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
@@ -24,81 +51,292 @@ load_dotenv(ENV_PATH)
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 STORE_NAME = os.getenv("FILE_SEARCH_STORE_NAME", "").strip()
+TRANSPORT = kb_http.get_transport()
+RESET_CONCURRENCY = int(os.getenv("RESET_CONCURRENCY", "8"))
+RESET_RATE_LIMIT = float(os.getenv("RESET_RATE_LIMIT", "10"))
+PROGRESS_SECONDS = 5.0
+MAX_PASSES = 10
 
 if not GEMINI_API_KEY:
     raise RuntimeError("❌ Falta GEMINI_API_KEY en .env")
-if not STORE_NAME:
-    raise RuntimeError("❌ Falta FILE_SEARCH_STORE_NAME en .env")
 
 client = genai.Client(api_key=GEMINI_API_KEY)
 
-def list_documents(store_name: str):
-    """Lista todos los documentos en el store usando el SDK de Google"""
+
+def iter_documents(store_name: str) -> Iterator:
+    """Recorre el Store página a página (SDK de Google o REST según KB_TRANSPORT)"""
+    if TRANSPORT == kb_http.TRANSPORT_REST:
+        return kb_http.iter_documents(store_name, GEMINI_API_KEY)
+    return iter(client.file_search_stores.documents.list(
+        parent=store_name,
+        config={"page_size": kb_http.DOCUMENTS_PAGE_SIZE},
+    ))
+
+
+def count_documents(store_name: str) -> Optional[int]:
+    """Documentos en el Store según sus contadores (para la ETA); None si no se pueden leer"""
     try:
-        docs_iterator = client.file_search_stores.documents.list(parent=store_name)
-        return list(docs_iterator)
+        if TRANSPORT == kb_http.TRANSPORT_REST:
+            store = kb_http.get_store(store_name, GEMINI_API_KEY)
+            counts = [store.get(k) for k in ("activeDocumentsCount", "pendingDocumentsCount", "failedDocumentsCount")]
+        else:
+            store = client.file_search_stores.get(name=store_name)
+            counts = [getattr(store, k, None) for k in
+                      ("active_documents_count", "pending_documents_count", "failed_documents_count")]
+        return sum(int(c or 0) for c in counts)
     except Exception as e:
-        logger.error(f"❌ Error listando documentos: {e}")
-        return []
+        logger.warning(f"⚠️ No se pudo leer el contador de documentos: {e}")
+        return None
+
 
 def delete_document(doc_name: str) -> bool:
-    """Borra un documento usando el SDK con force=true"""
+    """Borra un documento con force=true (SDK o REST según KB_TRANSPORT). Un 404 cuenta como borrado."""
     try:
-        client.file_search_stores.documents.delete(
-            name=doc_name,
-            config={"force": True}
-        )
-        logger.info(f"   ✓ Borrado: {doc_name.split('/')[-1]}")
+        if TRANSPORT == kb_http.TRANSPORT_REST:
+            kb_http.delete_document(doc_name, GEMINI_API_KEY, force=True)
+        else:
+            client.file_search_stores.documents.delete(
+                name=doc_name,
+                config={"force": True}
+            )
+        logger.debug(f"   ✓ Borrado: {doc_name.split('/')[-1]}")
         return True
     except Exception as e:
+        if kb_http.is_not_found(e):
+            return True
         logger.warning(f"   ⚠️ Error borrando {doc_name}: {e}")
         return False
 
-def main(auto_confirm=False):
+
+class DeleteJournal:
+    """IDs ya borrados, uno por línea (append + flush) para retomar un reset interrumpido"""
+
+    def __init__(self, store_name: str, fresh: bool = False):
+        self.path = ROOT / f".reset_kb.{store_name.split('/')[-1]}.journal"
+        if fresh and self.path.exists():
+            self.path.unlink()
+        self.deleted: Set[str] = set()
+        if self.path.exists():
+            self.deleted = {line.strip() for line in self.path.read_text().splitlines() if line.strip()}
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def record(self, doc_name: str):
+        with self._lock:
+            self.deleted.add(doc_name)
+            self._file.write(doc_name + "\n")
+            self._file.flush()
+
+    def close(self, remove: bool = False):
+        self._file.close()
+        if remove:
+            self.path.unlink(missing_ok=True)
+
+
+class Progress:
+    """Contadores thread-safe con log periódico de throughput y ETA"""
+
+    def __init__(self, total: Optional[int], already_done: int = 0):
+        self.total = total
+        self.already_done = already_done
+        self.deleted = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._last_log = self.started
+        self._lock = threading.Lock()
+
+    def add(self, ok: bool):
+        with self._lock:
+            if ok:
+                self.deleted += 1
+            else:
+                self.failed += 1
+            now = time.monotonic()
+            if now - self._last_log >= PROGRESS_SECONDS:
+                self._last_log = now
+                self.log()
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.deleted / elapsed if elapsed > 0 else 0.0
+
+    def log(self):
+        # `total` sale del listado actual (solo lo que queda): en un reset
+        # retomado, lo borrado en runs anteriores se suma a ambos lados
+        done = self.already_done + self.deleted
+        line = f"   🗑️  {done}"
+        if self.total:
+            overall = self.total + self.already_done
+            line += f"/{overall} ({min(100.0, 100 * done / overall):.0f}%)"
+        line += f" borrados · {self.rate:.1f} docs/s"
+        if self.total and self.rate > 0:
+            eta = max(0, self.total - self.deleted) / self.rate
+            line += f" · ETA {int(eta // 60)}m{int(eta % 60):02d}s"
+        if self.failed:
+            line += f" · {self.failed} errores"
+        logger.info(line)
+
+
+def delete_pass(store_name: str, journal: DeleteJournal, progress: Progress,
+                concurrency: int, limiter: kb_http.RateLimiter) -> int:
+    """
+    Una pasada: recorre el listado y borra en paralelo lo que no está en el journal.
+    Devuelve cuántos documentos pendientes encontró.
+    """
+    pending = 0
+    in_flight = threading.BoundedSemaphore(concurrency * 2)  # no encolar el Store entero
+
+    def delete_one(doc_name: str):
+        try:
+            limiter.acquire()
+            ok = delete_document(doc_name)
+            if ok:
+                journal.record(doc_name)
+            progress.add(ok)
+        finally:
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="kb-reset") as pool:
+        for doc in iter_documents(store_name):
+            doc_name = doc.name
+            if not doc_name or doc_name in journal.deleted:
+                continue
+            pending += 1
+            in_flight.acquire()
+            pool.submit(delete_one, doc_name)
+    return pending
+
+
+def resolve_target(alias: Optional[str]) -> StoreTarget:
+    targets = load_store_targets(STORE_NAME)
+    if alias is None:
+        target = targets[0]
+    else:
+        matches = [t for t in targets if t.alias == alias]
+        if not matches:
+            raise RuntimeError(f"❌ Destino '{alias}' no está en KB_STORE_TARGETS "
+                               f"({', '.join(t.alias for t in targets)})")
+        target = matches[0]
+    if not target.store_name:
+        raise RuntimeError("❌ Falta FILE_SEARCH_STORE_NAME en .env")
+    return target
+
+
+def main(auto_confirm=False, clear_state=False, target_alias=None, concurrency=RESET_CONCURRENCY,
+         rate=RESET_RATE_LIMIT, fresh=False):
+    target = resolve_target(target_alias)
+    store_name = target.store_name
+
     logger.info("=" * 60)
     logger.info("🧹 RESET DEL KB - VACIAR COMPLETAMENTE")
     logger.info("=" * 60)
-    logger.info(f"\n📌 Store: {STORE_NAME[:50]}...")
-    
-    # Listar documentos
-    logger.info("\n📋 Buscando documentos en el store...")
-    docs = list_documents(STORE_NAME)
-    
-    if not docs:
-        logger.warning("⚠️  No hay documentos para borrar. El store ya está vacío.")
-        return
-    
-    logger.info(f"   Encontrados: {len(docs)} documentos")
-    
+    logger.info(f"\n📌 Store: {store_name[:50]}...")
+    logger.info(f"   Transporte: {TRANSPORT}")
+    logger.info(f"   Concurrencia: {concurrency} · Límite: {rate:g} borrados/s")
+
+    journal = DeleteJournal(store_name, fresh=fresh)
+    if journal.deleted:
+        logger.info(f"   ↩️  Retomando reset anterior: {len(journal.deleted)} ya borrados ({journal.path.name})")
+
+    # Estimación (el listado completo no se carga en memoria)
+    with profiler.stage("count"):
+        total = count_documents(store_name)
+    if total is not None:
+        logger.info(f"\n📋 Documentos en el store: {total}")
+    if total == 0 and not journal.deleted:
+        # El contador puede ir retrasado: confirmar con la primera página
+        if next(iter_documents(store_name), None) is None:
+            logger.warning("⚠️  No hay documentos para borrar. El store ya está vacío.")
+            journal.close(remove=True)
+            if clear_state:
+                clear_sync_state(target)
+            return
+
     # Confirmación
     if not auto_confirm:
         logger.info("\n⚠️  ADVERTENCIA: Estás a punto de BORRAR TODOS los documentos.")
         confirm = input("¿Continuar? Escribe 'SI' para confirmar: ").strip().upper()
-        
+
         if confirm != "SI":
             logger.info("❌ Operación cancelada.")
+            journal.close()
             return
-    
-    # Borrar todos
+
+    # Borrar todos (pasadas hasta que el listado no devuelva nada pendiente)
     logger.info("\n🗑️  Borrando documentos...")
-    deleted = 0
-    failed = 0
-    for doc in docs:
-        doc_name = doc.name  # Document object has .name attribute, not .get()
-        if doc_name:
-            if delete_document(doc_name):
-                deleted += 1
-            else:
-                failed += 1
-    
+    limiter = kb_http.RateLimiter(rate)
+    progress = Progress(total, already_done=len(journal.deleted))
+    remaining = None
+    try:
+        for n in range(1, MAX_PASSES + 1):
+            failed_before = progress.failed
+            with profiler.stage(f"pass-{n}"):
+                pending = delete_pass(store_name, journal, progress, concurrency, limiter)
+            if pending == 0:
+                remaining = 0
+                break
+            logger.info(f"   Pasada {n}: {pending} documentos procesados")
+            remaining = pending
+            if progress.failed - failed_before == pending:
+                break  # nada avanzó en esta pasada: no insistir
+    except KeyboardInterrupt:
+        logger.warning(f"\n⚠️ Reset interrumpido: {journal.path.name} guarda lo borrado, "
+                       f"vuelve a ejecutar para retomar")
+        journal.close()
+        raise
+    progress.log()
+
     # Resumen
+    clean = remaining == 0
+    journal.close(remove=clean)
     logger.info("\n" + "=" * 60)
-    logger.info(f"✅ RESET COMPLETADO")
-    logger.info(f"   Documentos borrados: {deleted}")
-    if failed > 0:
-        logger.warning(f"   Errores: {failed}")
+    logger.info(f"✅ RESET COMPLETADO" if clean else f"⚠️  RESET INCOMPLETO")
+    logger.info(f"   Documentos borrados: {progress.deleted}"
+                + (f" (+{progress.already_done} en runs anteriores)" if progress.already_done else ""))
+    elapsed = time.monotonic() - progress.started
+    logger.info(f"   Tiempo: {elapsed:.1f}s · {progress.rate:.1f} docs/s")
+    if progress.failed > 0:
+        if clean:
+            logger.info(f"   Reintentos: {progress.failed} (fallaron y se borraron en otra pasada)")
+        else:
+            logger.warning(f"   Errores: {progress.failed}")
     logger.info("=" * 60)
+
+    if not clean:
+        logger.warning(f"\n👉 Quedan documentos: vuelve a ejecutar para retomar ({journal.path.name})")
+        if clear_state:
+            logger.warning(f"   (no se vacía {target.state_backend.path.name} hasta que el Store quede vacío)")
+        return
+
+    if clear_state:
+        clear_sync_state(target)
     logger.info("\n👉 El Store está vacío. Listo para un nuevo upload.")
 
+
+def clear_sync_state(target: StoreTarget):
+    """Vacía el estado del sync del destino (atómico) para que el próximo sync suba todo"""
+    backend = target.state_backend
+    backend.clear()
+    logger.info(f"   💾 {backend.path.name} vaciado")
+    # Las subidas pendientes apuntan a documentos que ya no existen
+    if len(target.pending):
+        target.pending.clear()
+        logger.info(f"   💾 {target.pending.path.name} vaciado")
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Vacía el File Search Store (borrado masivo reanudable)")
+    parser.add_argument("--yes", action="store_true", help="no pedir confirmación")
+    parser.add_argument("--clear-state", action="store_true", help="vaciar también el estado del sync")
+    parser.add_argument("--target", help="alias de KB_STORE_TARGETS (default: FILE_SEARCH_STORE_NAME)")
+    parser.add_argument("--concurrency", type=int, default=RESET_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=RESET_RATE_LIMIT, help="borrados/s (0 = sin límite)")
+    parser.add_argument("--fresh", action="store_true", help="ignorar el journal de un reset anterior")
+    args = parser.parse_args()
+    try:
+        with profiler.run("reset_kb"):
+            main(auto_confirm=args.yes, clear_state=args.clear_state, target_alias=args.target,
+                 concurrency=args.concurrency, rate=args.rate, fresh=args.fresh)
+    except KeyboardInterrupt:
+        exit(130)
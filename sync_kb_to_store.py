@@ -17,14 +17,21 @@ La solución: Mantener un mapeo local en sync_state.json:
 
 Flujo:
 1. Cargar sync_state.json (estado anterior)
-2. Calcular hash de cada .md en kb/
-3. Para cada archivo:
+2. Preprocesar cada .md en kb/ (kb_preprocess.py: frontmatter → metadata,
+   whitespace normalizado, docs grandes partidos en secciones "## ") y
+   calcular el hash de cada unidad ("kb/x.md" o "kb/x.md#seccion")
+3. Para cada unidad:
    - Sin cambios → saltar
    - Hash nuevo → BORRAR viejo (por store_doc_id) y SUBIR nuevo
    - Nuevo archivo → SUBIR
 4. Detectar eliminados (en sync_state pero no en kb/)
 5. Guardar sync_state.json con nuevo estado
 
+Varios Stores (KB_STORE_TARGETS, ver kb_stores.py): el KB se explora,
+hashea y preprocesa una sola vez; cada Store tiene su propio estado, recibe
+solo los docs que pasan su filtro de frontmatter (ej. visibility) y los
+Stores se sincronizan en paralelo (un hilo por Store).
+
 Garantías:
 ✅ Nunca duplica
 ✅ Detecta cambios
@@ -32,17 +39,32 @@ Garantías:
 ✅ Identificación 100% certera (path + hash + Store ID)
 """
 
+import io
 import os
-import hashlib
-import json
+import sys
+import signal
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Dict, Tuple, List
+from typing import Callable, Dict, Tuple, List
 
-import yaml
 from dotenv import load_dotenv
 from google import genai
 
+import kb_http
+from kb_local_index import LocalIndex
+from kb_graph import KbGraph
+from kb_manifest import build_manifest, write_manifest, MANIFEST_FILE
+from kb_pending import PendingUploads, UploadPending, is_expired, record_entry
+from kb_profile import profiler
+from kb_stores import StoreTarget, load_store_targets
+from kb_scheduler import UPLOAD_BUDGET, UPLOAD_ORDER, plan_batches, unit_cost
+from kb_watch import watch
+from kb_preprocess import DocUnit, prepare_document, unit_metadata, unit_path
+from kb_state import DEFAULT_ALIAS, get_state_backend
+from kb_docs import sha256_text
+
 # =========
 # Config & Logging
 # =========
@@ -55,8 +77,8 @@ logger = logging.getLogger(__name__)
 ROOT = Path(__file__).resolve().parent
 ENV_PATH = ROOT / ".env"
 KB_DIR = ROOT / "kb"
-STATE_FILE = ROOT / "sync_state.json"  # ← Archivo persistente en Git
-STATE_BASE_FILE = ROOT / "sync_state_base.json"  # ← Template base (vacío)
+STATE_BACKEND = get_state_backend()  # ← sync_state.json (default) o sync_state.sqlite, persistente en Git
+STATE_FILE = STATE_BACKEND.path
 
 # Cargar env variables
 if not os.getenv("GEMINI_API_KEY"):
@@ -65,6 +87,9 @@ if not os.getenv("GEMINI_API_KEY"):
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 STORE_NAME = os.getenv("FILE_SEARCH_STORE_NAME", "").strip()
 STORE_DISPLAY_NAME = os.getenv("STORE_DISPLAY_NAME", "zigchain-handbook-mvp").strip()
+TRANSPORT = kb_http.get_transport()
+SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", "4"))
+STORE_TARGETS = load_store_targets(STORE_NAME)
 
 if not GEMINI_API_KEY:
     raise RuntimeError("❌ Falta GEMINI_API_KEY en .env o en GitHub Actions secrets")
@@ -75,6 +100,12 @@ logger.info(f"📌 Config:")
 logger.info(f"   STORE_NAME: {STORE_NAME[:50]}..." if STORE_NAME else "   STORE_NAME: (crear nuevo)")
 logger.info(f"   STORE_DISPLAY_NAME: {STORE_DISPLAY_NAME}")
 logger.info(f"   KB_DIR: {KB_DIR}")
+logger.info(f"   TRANSPORT: {TRANSPORT}")
+logger.info(f"   STATE: {STATE_FILE.name} ({STATE_BACKEND.name})")
+if len(STORE_TARGETS) > 1:
+    logger.info(f"   STORES ({len(STORE_TARGETS)}):")
+    for _target in STORE_TARGETS:
+        logger.info(f"      {_target.describe()}")
 
 client = genai.Client(api_key=GEMINI_API_KEY)
 
@@ -82,38 +113,6 @@ client = genai.Client(api_key=GEMINI_API_KEY)
 # Helpers
 # =========
 
-def sha256_text(s: str) -> str:
-    """Calcula hash SHA256 de un texto"""
-    return hashlib.sha256(s.encode("utf-8", errors="ignore")).hexdigest()
-
-
-def parse_frontmatter(md_text: str) -> Tuple[Dict, str]:
-    """Extrae YAML frontmatter entre --- ... --- sin excepciones"""
-    text = md_text.lstrip()
-    if not text.startswith("---"):
-        return {}, md_text
-
-    lines = md_text.splitlines()
-    if not lines or lines[0].strip() != "---":
-        return {}, md_text
-
-    end = None
-    for i in range(1, min(len(lines), 300)):
-        if lines[i].strip() == "---":
-            end = i
-            break
-    if end is None:
-        return {}, md_text
-
-    try:
-        fm_raw = "\n".join(lines[1:end])
-        data = yaml.safe_load(fm_raw) or {}
-        return (data if isinstance(data, dict) else {}), md_text
-    except Exception as e:
-        logger.debug(f"⚠️ Frontmatter parse error (ignorado): {e}")
-        return {}, md_text
-
-
 def delete_document(store_doc_id: str) -> bool:
     """Borra un documento del File Search Store por su ID (con force=true para chunks)"""
     if not store_doc_id:
@@ -122,10 +121,13 @@ def delete_document(store_doc_id: str) -> bool:
     
     try:
         logger.info(f"   🗑️  Borrando documento: {store_doc_id[:60]}...")
-        client.file_search_stores.documents.delete(
-            name=store_doc_id,
-            config={"force": True}
-        )
+        if TRANSPORT == kb_http.TRANSPORT_REST:
+            kb_http.delete_document(store_doc_id, GEMINI_API_KEY, force=True)
+        else:
+            client.file_search_stores.documents.delete(
+                name=store_doc_id,
+                config={"force": True}
+            )
         logger.info(f"   ✅ Documento borrado")
         return True
     except Exception as e:
@@ -133,64 +135,38 @@ def delete_document(store_doc_id: str) -> bool:
         return False
 
 
-def build_metadata(kb_path: str, section: str, hash_val: str, fm: Dict) -> List[Dict]:
-    """Construye lista de metadata para subir a Store"""
-    meta = [
-        {"key": "path", "string_value": kb_path},
-        {"key": "section", "string_value": section},
-        {"key": "hash", "string_value": hash_val},
-    ]
-
-    # Agregar campos del frontmatter (incluye nuevo esquema solicitado)
-    keys_to_take = [
-        "title",
-        "description",
-        "doc_type",
-        "owner",
-        "owner_team",    # compatibilidad
-        "maintainer",
-        "visibility",
-        "last_updated",
-        "last_review",
-        "review_cycle_days",
-    ]
-
-    for key in keys_to_take:
-        if key in fm and fm.get(key) is not None:
-            val = fm.get(key)
-            if isinstance(val, list):
-                val_s = ",".join([str(x) for x in val])
-            else:
-                val_s = str(val)
-            meta.append({"key": key, "string_value": val_s})
-
-    # Agregar keywords si existen
-    keywords = fm.get("keywords")
-    if isinstance(keywords, list) and keywords:
-        meta.append({"key": "keywords_csv", "string_value": ",".join([str(k) for k in keywords])})
-
-    return meta
-
-
-def wait_for_operation(operation, max_wait_seconds: int = 60) -> bool:
-    """Espera a que una operación se complete"""
+def wait_for_operations(operations: List, max_wait_seconds: int = 60) -> List:
+    """
+    Espera a que un grupo de operaciones se complete (una ronda de polling
+    para todas) y devuelve las operaciones refrescadas, en el mismo orden.
+    """
     import time
+    operations = list(operations)
     waited = 0
-    while not operation.done and waited < max_wait_seconds:
+    while not all(op.done for op in operations) and waited < max_wait_seconds:
         time.sleep(2)
-        try:
-            operation = client.operations.get(str(operation.name))
-        except:
-            pass
+        for i, op in enumerate(operations):
+            if op.done:
+                continue
+            try:
+                operations[i] = client.operations.get(op)
+            except:
+                pass
         waited += 2
-    
-    if not operation.done:
-        logger.warning(f"   ⚠️ Operación no completó en {max_wait_seconds}s (continuando)")
-    
-    return operation.done
 
+    pending = sum(1 for op in operations if not op.done)
+    if pending:
+        logger.warning(f"   ⚠️ {pending} operación(es) no completaron en {max_wait_seconds}s (continuando)")
+
+    return operations
 
-def extract_document_id(operation, kb_path: str, store_name: str) -> str | None:
+
+def wait_for_operation(operation, max_wait_seconds: int = 60):
+    """Espera a que una operación se complete y la devuelve refrescada"""
+    return wait_for_operations([operation], max_wait_seconds)[0]
+
+
+def extract_document_id(operation, kb_path: str, store_name: str, chunk: str | None = None) -> str | None:
     """Extrae el document_id de una operación de upload (con retry)"""
     import time
     
@@ -210,15 +186,16 @@ def extract_document_id(operation, kb_path: str, store_name: str) -> str | None:
         logger.info(f"      ⏳ Buscando documento en el Store...")
         for attempt in range(5):  # Reintentar hasta 5 veces
             try:
-                docs = client.file_search_stores.documents.list(parent=store_name)
+                if TRANSPORT == kb_http.TRANSPORT_REST:
+                    docs = kb_http.iter_documents(store_name, GEMINI_API_KEY)
+                else:
+                    docs = client.file_search_stores.documents.list(parent=store_name)
                 for doc in docs:
-                    for meta_item in doc.custom_metadata:
-                        if meta_item.key == "path" and meta_item.string_value == kb_path:
-                            # Encontramos un documento con este path
-                            store_doc_id = str(doc.name)
-                            logger.info(f"      ✅ Document ID encontrado en listado")
-                            break
-                    if store_doc_id:
+                    meta_map = {m.key: m.string_value for m in doc.custom_metadata or []}
+                    if meta_map.get("path") == kb_path and meta_map.get("chunk") == chunk:
+                        # Encontramos un documento con este path (y sección)
+                        store_doc_id = str(doc.name)
+                        logger.info(f"      ✅ Document ID encontrado en listado")
                         break
                 
                 if store_doc_id and "documents/" in store_doc_id:
@@ -233,306 +210,821 @@ def extract_document_id(operation, kb_path: str, store_name: str) -> str | None:
     return store_doc_id if (store_doc_id and "documents/" in store_doc_id) else None
 
 
+def start_upload(unit: DocUnit, store_name: str, pending: PendingUploads | None = None):
+    """
+    Envía la subida de una unidad (doc normalizado o sección) y devuelve la
+    Operation. Con `pending`, la operación queda anotada en cuanto la API la acepta.
+    """
+    operation = client.file_search_stores.upload_to_file_search_store(
+        file=io.BytesIO(unit.text.encode("utf-8")),
+        file_search_store_name=store_name,
+        config={
+            "display_name": unit.key,
+            "mime_type": "text/markdown",
+            "custom_metadata": unit_metadata(unit),
+        },
+    )
+    if pending is not None and getattr(operation, "name", None):
+        pending.add(operation.name, unit, store_name)
+    return operation
+
+
+def finish_upload(unit: DocUnit, operation, store_name: str, pending: PendingUploads | None = None) -> str:
+    """
+    Extrae el store_doc_id de una subida. Si la operación no terminó (el doc
+    sigue indexando y no aparece en el listado) lanza UploadPending sin
+    buscarlo en el listado: queda en `pending` para otro run.
+    """
+    if not operation.done:
+        raise UploadPending(f"{unit.key} sigue indexando")
+    if getattr(operation, "error", None):
+        if pending is not None:
+            pending.resolve(operation.name)
+        raise Exception(f"La subida falló: {operation.error}")
+
+    # Extraer document_id (con retry automático si es necesario)
+    store_doc_id = extract_document_id(operation, unit.kb_path, store_name, unit.anchor)
+
+    if not store_doc_id:
+        logger.error(f"      ❌ No se pudo obtener document_id. Operation response: {operation.response}")
+        if pending is not None:
+            raise UploadPending(f"{unit.key} terminó pero no aparece en el Store todavía")
+        raise Exception("No se pudo extraer document_id del upload")
+
+    if pending is not None:
+        pending.resolve(operation.name)
+    logger.info(f"      ✅ Subido exitosamente")
+    logger.info(f"         Store ID: {store_doc_id[:60]}...")
+    return store_doc_id
+
+
+def upload_document(unit: DocUnit, store_name: str | None = None, pending: PendingUploads | None = None) -> str:
+    """Sube una unidad (doc normalizado o sección) con su metadata y devuelve el store_doc_id"""
+    store_name = store_name or STORE_NAME
+    # La subida devuelve una Operation, esperar a que complete
+    operation = wait_for_operation(start_upload(unit, store_name, pending))
+    return finish_upload(unit, operation, store_name, pending)
+
+
+def upload_batch(units: List[DocUnit], store_name: str,
+                 pending: PendingUploads | None = None) -> Dict[str, str | Exception]:
+    """
+    Sube un lote de unidades pequeñas: envía todas y espera sus operaciones
+    juntas. Devuelve {clave -> store_doc_id o la excepción de esa unidad}.
+    """
+    results: Dict[str, str | Exception] = {}
+    started = []
+    for unit in units:
+        try:
+            started.append((unit, start_upload(unit, store_name, pending)))
+        except Exception as e:
+            results[unit.key] = e
+    operations = wait_for_operations([op for _, op in started])
+    for (unit, _), operation in zip(started, operations):
+        try:
+            results[unit.key] = finish_upload(unit, operation, store_name, pending)
+        except Exception as e:
+            results[unit.key] = e
+    return results
+
+
+def get_upload_operation(operation_name: str):
+    """Operation de subida por nombre (para resolver las pendientes de otro run)"""
+    if TRANSPORT == kb_http.TRANSPORT_REST:
+        return kb_http.as_operation(kb_http.get_operation(operation_name, GEMINI_API_KEY))
+    return client.operations.get(genai.types.UploadToFileSearchStoreOperation(name=operation_name))
+
+
+def reconcile_pending(pending: PendingUploads, state: Dict[str, dict], log=logger) -> List[str]:
+    """
+    Resuelve las subidas pendientes de runs anteriores (kb_pending.py) contra
+    `state`, en sitio. Devuelve las claves que entraron al estado. Las que
+    siguen indexando se quedan en `pending`; save() persiste lo resuelto.
+    """
+    records = pending.unresolved()
+    if not records:
+        return []
+    log.info(f"\n⏳ Resolviendo {len(records)} subida(s) pendiente(s)...")
+    resolved_keys = []
+    for operation_name, record in records.items():
+        key = record["key"]
+        try:
+            operation = get_upload_operation(operation_name)
+        except Exception as e:
+            if kb_http.is_not_found(e) or is_expired(record):
+                log.warning(f"   ⚠️ {key}: la operación ya no está disponible, se volverá a subir "
+                            f"(revisa duplicados con audit_kb.py)")
+                pending.resolve(operation_name)
+            else:
+                log.warning(f"   ⚠️ {key}: no se pudo consultar la operación ({e}), se reintenta luego")
+            continue
+
+        if getattr(operation, "error", None):
+            log.warning(f"   ❌ {key}: la subida falló ({operation.error}), se volverá a subir")
+            pending.resolve(operation_name)
+            continue
+
+        # Sin terminar no se busca en el listado: un doc indexando no aparece
+        store_doc_id = None
+        if operation.done:
+            store_doc_id = extract_document_id(operation, record["path"], record["store_name"], record.get("chunk"))
+        if not store_doc_id:
+            if is_expired(record):
+                log.warning(f"   ⚠️ {key}: pendiente desde {record.get('accepted_at')}, se descarta y se volverá a subir")
+                pending.resolve(operation_name)
+            else:
+                log.info(f"   ⏳ {key}: sigue indexando")
+            continue
+
+        current = state.get(key) or {}
+        if record.get("superseded"):
+            # Se subió una versión más nueva mientras esta indexaba
+            log.info(f"   🗑️  {key}: versión obsoleta, se borra")
+            delete_document(store_doc_id)
+        elif current.get("store_doc_id") == store_doc_id:
+            pass  # el estado ya lo tenía
+        elif current.get("hash") == record.get("hash") and current.get("store_doc_id"):
+            log.info(f"   🗑️  {key}: duplicado de {current['store_doc_id'][:60]}..., se borra")
+            delete_document(store_doc_id)
+        else:
+            state[key] = record_entry(record, store_doc_id)
+            resolved_keys.append(key)
+            log.info(f"   ✅ {key} → {store_doc_id[:60]}...")
+        pending.resolve(operation_name)
+    return resolved_keys
+
+
+def state_entry(unit: DocUnit, store_doc_id: str) -> dict:
+    """Entrada de sync_state.json para una unidad subida"""
+    return {
+        "hash": unit.hash,
+        "body_hash": unit.body_hash,
+        "meta_hash": unit.meta_hash,
+        "store_doc_id": store_doc_id,
+    }
+
+
+def read_units(p: Path) -> Tuple[str, List[DocUnit]]:
+    """Lee un .md y devuelve (hash del archivo crudo, unidades preprocesadas)"""
+    _, kb_path = kb_path_of(p)
+    content = p.read_text(encoding="utf-8", errors="ignore")
+    _, units = prepare_document(kb_path, content)
+    return sha256_text(content), units
+
+
+def discover_md_files() -> List[Path]:
+    """Lista ordenada de .md en kb/ (sin TEMPLATE.md)"""
+    md_files = sorted(KB_DIR.rglob("*.md"))
+    return [p for p in md_files if p.name.lower() != "template.md"]
+
+
+def kb_path_of(p: Path) -> Tuple[str, str]:
+    """Devuelve (rel, kb_path) para un archivo dentro de kb/"""
+    rel = p.relative_to(KB_DIR).as_posix()
+    return rel, f"kb/{rel}"
+
+
 # =========
 # State Management
 # =========
 
-def load_sync_state() -> Dict[str, dict]:
+def load_sync_state(backend=None):
     """
-    Carga el estado anterior: {kb_path -> {"hash": str, "store_doc_id": str}}
-    
-    Compatible con versión antigua que solo tenía hashes (strings).
-    
-    En GitHub Actions (primera ejecución):
-    - Si sync_state.json está vacío o no existe
-    - Usa sync_state_base.json como base (también vacío)
+    Carga el estado anterior: {clave -> {"hash", "body_hash", "meta_hash", "store_doc_id"}}
+
+    El backend se elige con KB_STATE_BACKEND (kb_state.py): sync_state.json
+    (default) o sync_state.sqlite (compacto, carga perezosa).
     """
-    if STATE_FILE.exists():
-        try:
-            data = json.loads(STATE_FILE.read_text())
-            
-            # Si el archivo está vacío o es un dict vacío
-            if not data:
-                logger.info(f"📝 Primer run detectado - usando template base")
-                if STATE_BASE_FILE.exists():
-                    data = json.loads(STATE_BASE_FILE.read_text())
-            
-            # Convertir formato antiguo (solo strings) al nuevo (dicts)
-            new_format = {}
-            for path, value in data.items():
-                if isinstance(value, str):
-                    # Formato antiguo: solo el hash
-                    new_format[path] = {
-                        "hash": value,
-                        "store_doc_id": None,  # No lo tenemos del formato anterior
-                    }
-                else:
-                    # Formato nuevo: ya es un dict
-                    new_format[path] = value
-            
-            return new_format
-            
-        except Exception as e:
-            logger.warning(f"⚠️ Error loading sync_state.json: {e}")
-            return {}
-    logger.info(f"📝 Primer run: sin estado anterior (archivo no existe)")
-    return {}
+    return (backend or STATE_BACKEND).load()
 
 
-def save_sync_state(state: Dict[str, dict]):
-    """Guarda el estado actual: {kb_path -> {"hash": str, "store_doc_id": str}}"""
+def save_sync_state(state, backend=None):
+    """Guarda el estado actual (el backend sqlite solo escribe lo que cambió)"""
+    backend = backend or STATE_BACKEND
     try:
-        STATE_FILE.write_text(json.dumps(state, indent=2))
-        logger.info(f"💾 sync_state.json guardado: {len(state)} documentos")
+        backend.save(state)
+        logger.info(f"💾 {backend.path.name} guardado: {len(state)} documentos")
     except Exception as e:
-        logger.error(f"❌ Error saving sync_state.json: {e}")
+        logger.error(f"❌ Error saving {backend.path.name}: {e}")
         raise
 
 
+def update_local_index(current_hashes: Dict[str, str]):
+    """Refresca el índice local BM25 y el grafo de links (kb_index.sqlite) con el mismo diff de hashes"""
+    try:
+        with LocalIndex() as index:
+            result = index.refresh(current_hashes, ROOT)
+        logger.info(f"   📚 Índice local: {result['reindexed']} reindexados, "
+                    f"{result['removed']} eliminados, {result['unchanged']} sin cambios")
+    except Exception as e:
+        logger.warning(f"   ⚠️ No se pudo actualizar el índice local: {e}")
+    try:
+        with KbGraph() as graph:
+            result = graph.refresh(current_hashes, ROOT)
+        logger.info(f"   🕸️  Grafo del KB: {result['updated']} actualizados, "
+                    f"{result['removed']} eliminados, {result['unchanged']} sin cambios")
+    except Exception as e:
+        logger.warning(f"   ⚠️ No se pudo actualizar el grafo del KB: {e}")
+
+
+def publish_manifest(old_state: Dict[str, dict], new_state: Dict[str, dict], changed_paths: List[str],
+                     store_name: str | None = None, path: Path = MANIFEST_FILE):
+    """Publica kb_change_manifest.json para que el bot se recargue en caliente"""
+    try:
+        manifest = build_manifest(old_state, new_state, store_name or STORE_NAME, changed_paths)
+        write_manifest(manifest, path)
+        logger.info(f"   🔁 Manifiesto KB v{manifest['kb_version']}: {len(manifest['added'])} nuevos, "
+                    f"{len(manifest['changed'])} cambiados, {len(manifest['removed'])} eliminados → {path.name}")
+    except Exception as e:
+        logger.warning(f"   ⚠️ No se pudo publicar el manifiesto: {e}")
+
+
+def git_state_files() -> List[Path]:
+    """Estado y subidas pendientes (kb_pending.py) de cada Store que existen en disco"""
+    files = [t.state_backend.path for t in STORE_TARGETS if t.state_backend.path.exists()]
+    for t in STORE_TARGETS:
+        files += t.pending.files()  # sync_pending*.json + su journal
+    return files
+
+
+def commit_state_to_git(state_files: List[Path] | None = None):
+    """Commitea y pushea los archivos de estado (solo tiene sentido en CI/CD)"""
+    state_files = state_files or [STATE_FILE]
+    names = ", ".join(f.name for f in state_files)
+    try:
+        import subprocess
+
+        # Configurar git user (necesario en GitHub Actions)
+        subprocess.run(["git", "config", "--global", "user.email", "sync@github.local"], check=False)
+        subprocess.run(["git", "config", "--global", "user.name", "KB Sync Bot"], check=False)
+
+        # Add the sync state files
+        result_add = subprocess.run(["git", "add", *map(str, state_files)], capture_output=True, text=True)
+        if result_add.returncode != 0:
+            logger.warning(f"   ⚠️ Error en 'git add': {result_add.stderr}")
+
+        # Verificar si hay cambios para commitear
+        result_diff = subprocess.run(["git", "diff", "--cached", "--quiet"], capture_output=True)
+        if result_diff.returncode != 0:  # Hay cambios (exit code 1 si hay diferencias)
+            # Hacer commit
+            result_commit = subprocess.run(
+                ["git", "commit", "-m", f"chore: update {names} after KB sync"],
+                capture_output=True,
+                text=True
+            )
+            if result_commit.returncode != 0:
+                logger.warning(f"   ⚠️ Error en 'git commit': {result_commit.stderr}")
+            else:
+                logger.info(f"   ✓ Commit realizado")
+
+                # Hacer push
+                result_push = subprocess.run(
+                    ["git", "push", "origin", "main"],
+                    capture_output=True,
+                    text=True
+                )
+                if result_push.returncode != 0:
+                    logger.warning(f"   ⚠️ Error en 'git push': {result_push.stderr}")
+                else:
+                    logger.info(f"   ✅ {names} pusheado exitosamente")
+        else:
+            logger.info(f"   ✓ No hay cambios en {names} para commitear")
+    except Exception as e:
+        logger.warning(f"   ⚠️ Error al procesar git operations: {e}")
+
+
 # =========
-# Main Sync Logic
+# Multi-Store
 # =========
 
-def main():
+class StoreLogAdapter(logging.LoggerAdapter):
+    """Prefija los logs con el alias del Store cuando hay varios destinos en paralelo"""
+
+    def process(self, msg, kwargs):
+        alias = self.extra.get("alias")
+        if not alias:
+            return msg, kwargs
+        text = str(msg)
+        stripped = text.lstrip("\n")
+        return f"{text[:len(text) - len(stripped)]}[{alias}] {stripped}", kwargs
+
+
+def store_logger(target: StoreTarget) -> logging.LoggerAdapter:
+    return StoreLogAdapter(logger, {"alias": target.alias if len(STORE_TARGETS) > 1 else None})
+
+
+def ensure_store(target: StoreTarget):
+    """Crea el Store del destino si no tiene nombre configurado"""
     global STORE_NAME
+    log = store_logger(target)
+    if target.store_name:
+        log.info(f"\n✅ PASO 1: Store existente: {target.store_name}")
+        return
 
-    logger.info("=" * 70)
-    logger.info("🚀 SMART SYNC: KB → File Search Store (con sync_state.json)")
-    logger.info("=" * 70)
+    log.info("\n📦 PASO 1: Creando nuevo File Search Store...")
+    try:
+        display_name = STORE_DISPLAY_NAME if target.alias == DEFAULT_ALIAS else f"{STORE_DISPLAY_NAME}-{target.alias}"
+        store = client.file_search_stores.create(
+            config={"display_name": display_name}
+        )
+        target.store_name = store.name
+        log.info(f"✅ Store creado: {target.store_name}")
+        log.info(f"\n👉 IMPORTANTE: Guarda esto en tu .env:")
+        if target.alias == DEFAULT_ALIAS:
+            STORE_NAME = target.store_name
+            log.info(f"   FILE_SEARCH_STORE_NAME={STORE_NAME}")
+        else:
+            log.info(f"   KB_STORE_TARGETS=...,{target.alias}={target.store_name},...")
+    except Exception as e:
+        log.error(f"❌ Error creando store: {e}")
+        raise
 
-    # ─────────────────────────────────────────────────────────────
-    # 1. Asegurar que existe el Store
-    # ─────────────────────────────────────────────────────────────
-    if not STORE_NAME:
-        logger.info("\n📦 PASO 1: Creando nuevo File Search Store...")
+
+# Ctrl+C / SIGTERM solo llega al hilo principal: este evento lo propaga a los
+# hilos de cada Store y de las subidas para que guarden lo completado
+CANCELLED = threading.Event()
+
+
+def check_cancelled():
+    """Relanza la cancelación en el hilo actual (KeyboardInterrupt) si se pidió"""
+    if CANCELLED.is_set():
+        raise KeyboardInterrupt
+
+
+def fan_out(fn: Callable[[StoreTarget], object], targets: List[StoreTarget]) -> Dict[str, object]:
+    """
+    Ejecuta `fn(target)` para cada Store en paralelo (un hilo por Store).
+    Un Store que falla no detiene a los demás; el primer error se relanza al final.
+    Ante Ctrl+C espera a que cada Store guarde lo completado y relanza la cancelación.
+    """
+    if len(targets) == 1:
+        return {targets[0].alias: fn(targets[0])}
+
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix="kb-store") as pool:
+        futures = {target.alias: pool.submit(fn, target) for target in targets}
         try:
-            store = client.file_search_stores.create(
-                config={"display_name": STORE_DISPLAY_NAME}
-            )
-            STORE_NAME = store.name
-            logger.info(f"✅ Store creado: {STORE_NAME}")
-            logger.info(f"\n👉 IMPORTANTE: Guarda esto en tu .env:")
-            logger.info(f"   FILE_SEARCH_STORE_NAME={STORE_NAME}")
-        except Exception as e:
-            logger.error(f"❌ Error creando store: {e}")
+            wait(futures.values())
+        except KeyboardInterrupt:
+            CANCELLED.set()
+            logger.warning("\n⚠️ Sync cancelado: esperando a que cada Store guarde lo completado...")
+            wait(futures.values())
             raise
-    else:
-        logger.info(f"\n✅ PASO 1: Store existente: {STORE_NAME}")
+        for alias, future in futures.items():
+            try:
+                results[alias] = future.result()
+            except Exception as e:
+                logger.error(f"❌ [{alias}] Sync fallido: {e}")
+                errors[alias] = e
+    if errors:
+        raise next(iter(errors.values()))
+    return results
 
-    # ─────────────────────────────────────────────────────────────
-    # 2. Cargar estado anterior (sync_state.json)
-    # ─────────────────────────────────────────────────────────────
-    logger.info(f"\n📋 PASO 2: Cargando estado anterior...")
-    old_state = load_sync_state()
-    logger.info(f"   Documentos en sync_state.json: {len(old_state)}")
+
+# =========
+# Upload Scheduling
+# =========
+
+def run_uploads(units: List[DocUnit], store_name: str, old_state: Dict[str, dict], new_state: Dict[str, dict],
+                changed_paths: List[str], log: logging.LoggerAdapter, pending: PendingUploads | None = None) -> int:
+    """
+    Sube `units` según kb_scheduler: orden por tamaño (KB_UPLOAD_ORDER), lotes
+    de unidades pequeñas, SYNC_CONCURRENCY lotes en paralelo y el presupuesto
+    de bytes en vuelo compartido entre Stores (ancho de banda, no memoria:
+    `units` ya tiene el texto cargado). Si un lote falla no se
+    planifican más y se relanza el error cuando terminan los que estaban en vuelo.
+    Lo mismo ante una cancelación (Ctrl+C / SIGTERM): terminan los lotes en
+    vuelo, se descartan los encolados y se relanza KeyboardInterrupt.
+    Las que siguen indexando al terminar quedan en `pending` (no son error);
+    devuelve cuántas.
+    """
+    batches = plan_batches(units, UPLOAD_ORDER)
+    log.info(f"\n⬆️  Subiendo {len(units)} unidades en {len(batches)} lotes "
+             f"(orden: {UPLOAD_ORDER}, concurrencia: {SYNC_CONCURRENCY})...")
+    failed = threading.Event()
+    still_pending: List[str] = []
+
+    def run_batch(batch: List[DocUnit]):
+        if failed.is_set() or CANCELLED.is_set():
+            return
+        cost = sum(unit_cost(unit) for unit in batch)
+        with UPLOAD_BUDGET.reserve(cost):
+            # Borrar documentos viejos del Store (si tenemos su ID) antes de subir el reemplazo
+            for unit in batch:
+                old_doc_id = old_state.get(unit.key, {}).get("store_doc_id")
+                if old_doc_id:
+                    delete_document(old_doc_id)
+            if len(batch) == 1:
+                unit = batch[0]
+                try:
+                    results = {unit.key: upload_document(unit, store_name, pending)}
+                except Exception as e:
+                    results = {unit.key: e}
+            else:
+                results = upload_batch(batch, store_name, pending)
+
+        error = None
+        for unit in batch:
+            result = results[unit.key]
+            if isinstance(result, UploadPending) and pending is not None:
+                # Aceptada e indexando: la resuelve el próximo run (sin volver a subirla)
+                log.warning(f"      ⏳ {unit.key}: sigue indexando, queda en {pending.path.name}")
+                still_pending.append(unit.key)
+                continue
+            if isinstance(result, Exception):
+                log.error(f"      ❌ Error subiendo {unit.key}: {result}")
+                # Mantener entrada antigua si la había
+                if unit.key in old_state:
+                    new_state[unit.key] = old_state[unit.key]
+                error = error or result
+                continue
+            # Guardar en nuevo estado
+            new_state[unit.key] = state_entry(unit, result)
+            changed_paths.append(unit.key)
+            log.info(f"   ✅ {unit.key} ({unit_cost(unit)} bytes)")
+        if error is not None:
+            failed.set()
+            raise error
+
+    with ThreadPoolExecutor(max_workers=max(1, SYNC_CONCURRENCY), thread_name_prefix="kb-upload") as pool:
+        futures = [pool.submit(run_batch, batch) for batch in batches]
+        try:
+            wait(futures)
+        except KeyboardInterrupt:
+            CANCELLED.set()
+            log.warning("\n⚠️ Sync cancelado: esperando a que terminen las subidas en vuelo...")
+            pool.shutdown(cancel_futures=True)
+            raise
+    check_cancelled()
+    errors = [f.exception() for f in futures if f.exception() is not None]
+    if errors:
+        raise errors[0]
+    return len(still_pending)
+
+
+# =========
+# Main Sync Logic
+# =========
+
+def sync_store(target: StoreTarget, all_units: Dict[str, DocUnit]) -> Dict[str, int]:
+    """
+    PASOS 2, 4, 5 y 6 para un Store: diff contra su propio estado, subidas,
+    borrados, guardado y manifiesto. `all_units` ya viene preprocesado
+    (compartido entre Stores); aquí solo se filtra por el frontmatter.
+    """
+    log = store_logger(target)
+    backend = target.state_backend
+    pending = target.pending
+    store_name = target.store_name
 
     # ─────────────────────────────────────────────────────────────
-    # 3. Descubrir archivos .md en kb/ y calcular hashes
+    # 2. Cargar estado anterior (sync_state.json)
     # ─────────────────────────────────────────────────────────────
-    logger.info(f"\n📄 PASO 3: Explorando kb/ y calculando hashes...")
-    md_files = sorted(KB_DIR.rglob("*.md"))
-    md_files = [p for p in md_files if p.name.lower() != "template.md"]
-    logger.info(f"   Archivos encontrados: {len(md_files)}")
-
-    # Calcular hashes de archivos actuales
-    current_hashes = {}
-    for p in md_files:
-        rel = p.relative_to(KB_DIR).as_posix()
-        kb_path = f"kb/{rel}"
-        content = p.read_text(encoding="utf-8", errors="ignore")
-        current_hashes[kb_path] = sha256_text(content)
+    log.info(f"\n📋 PASO 2: Cargando estado anterior...")
+    # Copia en memoria: el backend sqlite escribe sobre su vista al guardar
+    with profiler.stage(f"{target.alias}/state-load"):
+        saved_state = dict(load_sync_state(backend))
+    log.info(f"   Documentos en {backend.path.name}: {len(saved_state)}")
+
+    # Subidas aceptadas en runs anteriores que aún no tenían document_id
+    old_state = dict(saved_state)
+    with profiler.stage(f"{target.alias}/reconcile"):
+        resolved_keys = reconcile_pending(pending, old_state, log)
+    pending_hashes = pending.pending_hashes()
+
+    # Solo las unidades que el filtro del Store acepta; el resto cuenta como eliminado
+    current_units = {key: unit for key, unit in all_units.items() if target.accepts(unit.fm)}
+    if len(current_units) != len(all_units):
+        log.info(f"   Unidades para este Store: {len(current_units)} de {len(all_units)}")
 
     # ─────────────────────────────────────────────────────────────
     # 4. Procesamiento: NUEVO / CAMBIO / SIN CAMBIOS
     # ─────────────────────────────────────────────────────────────
-    logger.info(f"\n🔄 PASO 4: Procesando cambios...")
+    log.info(f"\n🔄 PASO 4: Procesando cambios...")
     new_state = {}
-    stats = {"uploaded": 0, "updated": 0, "unchanged": 0, "deleted": 0}
-
-    for p in md_files:
-        rel = p.relative_to(KB_DIR).as_posix()
-        kb_path = f"kb/{rel}"
-        new_hash = current_hashes[kb_path]
-
-        logger.info(f"\n   📄 {kb_path}")
-
-        # ╔═══════════════════════════════════════════════════════╗
-        # ║ CASO 1: Archivo existía antes                         ║
-        # ╚═══════════════════════════════════════════════════════╝
-        if kb_path in old_state:
-            old_entry = old_state[kb_path]
-            old_hash = old_entry.get("hash")
-            store_doc_id = old_entry.get("store_doc_id")
-
-            # Subcase 1a: Sin cambios
-            if new_hash == old_hash:
-                logger.info(f"      ✓ Sin cambios (hash igual)")
-                new_state[kb_path] = old_entry  # Mantener Store ID
-                stats["unchanged"] += 1
+    to_upload: List[DocUnit] = []
+    changed_paths = list(resolved_keys)
+    stats = {"uploaded": 0, "updated": 0, "unchanged": 0, "deleted": 0, "pending": 0}
+
+    try:
+        for key, unit in current_units.items():
+            new_hash = unit.hash
+
+            log.info(f"\n   📄 {key}")
+
+            # Subida de esta misma versión aceptada y aún indexando: no repetirla.
+            # Si la versión cambió, la pendiente se borrará al resolverse.
+            pending_hash = pending_hashes.get(key)
+            if pending_hash is not None and pending_hash != new_hash:
+                pending.supersede(key)
+            elif pending_hash == new_hash and old_state.get(key, {}).get("hash") != new_hash:
+                log.info(f"      ⏳ Indexando (subida pendiente de un run anterior)")
+                stats["pending"] += 1
                 continue
 
-            # Subcase 1b: Cambió el contenido
-            else:
-                logger.info(f"      🔄 ACTUALIZACIÓN DETECTADA")
-                logger.info(f"         Old hash: {old_hash[:16]}...")
-                logger.info(f"         New hash: {new_hash[:16]}...")
-                
-                # Borrar documento viejo del Store (si tenemos su ID)
-                if store_doc_id:
-                    logger.info(f"      🗑️  Borrando documento obsoleto...")
-                    delete_document(store_doc_id)
+            # ╔═══════════════════════════════════════════════════════╗
+            # ║ CASO 1: Unidad existía antes                          ║
+            # ╚═══════════════════════════════════════════════════════╝
+            if key in old_state:
+                old_entry = old_state[key]
+                old_hash = old_entry.get("hash")
+                store_doc_id = old_entry.get("store_doc_id")
+
+                # Subcase 1a: Sin cambios
+                if new_hash == old_hash:
+                    log.info(f"      ✓ Sin cambios (hash igual)")
+                    new_state[key] = old_entry  # Mantener Store ID
+                    stats["unchanged"] += 1
+                    continue
+
+                # Subcase 1b: Cambió el contenido
                 else:
-                    # No tenemos ID (formato antiguo). Tratarlo como nuevo
-                    logger.info(f"         (sin ID antiguo, tratando como nuevo)")
+                    log.info(f"      🔄 ACTUALIZACIÓN DETECTADA")
+                    log.info(f"         Old hash: {old_hash[:16]}...")
+                    log.info(f"         New hash: {new_hash[:16]}...")
+                    if old_entry.get("body_hash"):
+                        body_changed = old_entry["body_hash"] != unit.body_hash
+                        meta_changed = old_entry.get("meta_hash") != unit.meta_hash
+                        log.info(f"         Cambió: {'contenido ' if body_changed else ''}{'metadata' if meta_changed else ''}")
+                
+                    # El documento viejo se borra justo antes de subir el reemplazo
+                    if not store_doc_id:
+                        # No tenemos ID (formato antiguo). Tratarlo como nuevo
+                        log.info(f"         (sin ID antiguo, tratando como nuevo)")
                 
-                stats["updated"] += 1
+                    stats["updated"] += 1
 
-        # ╔═══════════════════════════════════════════════════════╗
-        # ║ CASO 2: Archivo es NUEVO                              ║
-        # ╚═══════════════════════════════════════════════════════╝
-        else:
-            logger.info(f"      ⬆️  ARCHIVO NUEVO")
-            stats["uploaded"] += 1
-
-        # ─────────────────────────────────────────────────────────
-        # Subir documento (NUEVO o reemplazo)
-        # ─────────────────────────────────────────────────────────
-        logger.info(f"      ⏳ Subiendo a Store...")
-        
-        content = p.read_text(encoding="utf-8", errors="ignore")
-        fm, _ = parse_frontmatter(content)
-        
-        # Construir metadata usando helper
-        section = rel.split("/", 1)[0]
-        meta = build_metadata(kb_path, section, new_hash, fm)
-
-        # Subir al Store
-        try:
-            response = client.file_search_stores.upload_to_file_search_store(
-                file=str(p),
-                file_search_store_name=STORE_NAME,
-                config={
-                    "display_name": kb_path,
-                    "mime_type": "text/markdown",
-                    "custom_metadata": meta,
-                },
-            )
-            
-            # response es una Operation, esperar a que complete
-            operation = response
-            wait_for_operation(operation)
-            
-            # Extraer document_id (con retry automático si es necesario)
-            store_doc_id = extract_document_id(operation, kb_path, STORE_NAME)
-            
-            if not store_doc_id:
-                logger.error(f"      ❌ No se pudo obtener document_id. Operation response: {operation.response}")
-                raise Exception("No se pudo extraer document_id del upload")
-            
-            logger.info(f"      ✅ Subido exitosamente")
-            logger.info(f"         Store ID: {store_doc_id[:60]}...")
-            
-            # Guardar en nuevo estado
-            new_state[kb_path] = {
-                "hash": new_hash,
-                "store_doc_id": store_doc_id,
-            }
+            # ╔═══════════════════════════════════════════════════════╗
+            # ║ CASO 2: Unidad es NUEVA                               ║
+            # ╚═══════════════════════════════════════════════════════╝
+            else:
+                log.info(f"      ⬆️  ARCHIVO NUEVO")
+                stats["uploaded"] += 1
+
+            # Subida (NUEVO o reemplazo) en la fase planificada de abajo
+            to_upload.append(unit)
+
+        # ─────────────────────────────────────────────────────────────
+        # 4b. Subir documentos (NUEVOS o reemplazos) según el plan por tamaño
+        # ─────────────────────────────────────────────────────────────
+        if to_upload:
+            with profiler.stage(f"{target.alias}/uploads"):
+                stats["pending"] += run_uploads(to_upload, store_name, old_state, new_state, changed_paths, log, pending)
+
+        # ─────────────────────────────────────────────────────────────
+        # 5. Detectar ELIMINADOS (archivos o secciones que ya no existen)
+        # ─────────────────────────────────────────────────────────────
+        log.info(f"\n🗑️  PASO 5: Detectando eliminados...")
+        with profiler.stage(f"{target.alias}/deletes"):
+            for key in pending_hashes:
+                if key not in current_units:
+                    pending.supersede(key)  # se borra cuando termine de indexar
+            for key in old_state:
+                if key not in current_units:
+                    check_cancelled()
+                    log.info(f"   {key}")
+                    if key in all_units:
+                        log.info(f"      ⚠️ Ya no pasa el filtro de este Store")
+                    else:
+                        log.info(f"      ⚠️ Path ya no existe en kb/")
 
-        except Exception as e:
-            logger.error(f"      ❌ Error subiendo: {e}")
-            # Mantener entrada antigua si la había
-            if kb_path in old_state:
-                new_state[kb_path] = old_state[kb_path]
-            raise
+                    store_doc_id = old_state[key].get("store_doc_id")
+                    if store_doc_id:
+                        delete_document(store_doc_id)
+                    stats["deleted"] += 1
+    except KeyboardInterrupt:
+        # Lo no procesado conserva su entrada anterior; lo ya subido, la nueva.
+        # Las subidas aceptadas sin terminar quedan en el journal de pendientes.
+        CANCELLED.set()
+        log.warning(f"\n⚠️ Sync cancelado: guardando el trabajo completado...")
+        partial_state = {**old_state, **new_state}
+        save_sync_state(partial_state, backend)
+        pending.save()
+        publish_manifest(saved_state, partial_state, changed_paths, store_name, target.manifest_path)
+        raise
 
     # ─────────────────────────────────────────────────────────────
-    # 5. Detectar archivos ELIMINADOS (estaban antes, ya no existen)
+    # 6. Guardar nuevo estado
     # ─────────────────────────────────────────────────────────────
-    logger.info(f"\n🗑️  PASO 5: Detectando eliminados...")
-    for kb_path in old_state:
-        if kb_path not in current_hashes:
-            logger.info(f"   {kb_path}")
-            logger.info(f"      ⚠️ Path ya no existe en kb/")
-            
-            store_doc_id = old_state[kb_path].get("store_doc_id")
-            if store_doc_id:
-                delete_document(store_doc_id)
-            stats["deleted"] += 1
+    log.info(f"\n💾 PASO 6: Guardando nuevo estado...")
+    with profiler.stage(f"{target.alias}/state-save"):
+        save_sync_state(new_state, backend)
+        pending.save()
+        publish_manifest(saved_state, new_state, changed_paths, store_name, target.manifest_path)
+
+    stats["total"] = len(new_state)
+    return stats
+
+
+def main():
+    logger.info("=" * 70)
+    logger.info("🚀 SMART SYNC: KB → File Search Store (con sync_state.json)")
+    logger.info("=" * 70)
 
     # ─────────────────────────────────────────────────────────────
-    # 6. Guardar nuevo estado
+    # 1. Asegurar que existen los Stores
+    # ─────────────────────────────────────────────────────────────
+    with profiler.stage("ensure-stores"):
+        for target in STORE_TARGETS:
+            ensure_store(target)
+
+    # ─────────────────────────────────────────────────────────────
+    # 3. Descubrir archivos .md en kb/ y calcular hashes (una sola vez)
     # ─────────────────────────────────────────────────────────────
-    logger.info(f"\n💾 PASO 6: Guardando nuevo estado...")
-    save_sync_state(new_state)
+    logger.info(f"\n📄 PASO 3: Explorando kb/ y calculando hashes...")
+    with profiler.stage("discover"):
+        md_files = discover_md_files()
+    logger.info(f"   Archivos encontrados: {len(md_files)}")
+
+    # Preprocesar (frontmatter → metadata, whitespace normalizado, secciones)
+    # y calcular hashes por unidad. file_hashes (archivo crudo) es para el índice local.
+    current_units: Dict[str, DocUnit] = {}
+    file_hashes = {}
+    with profiler.stage("preprocess"):
+        for p in md_files:
+            _, kb_path = kb_path_of(p)
+            file_hashes[kb_path], units = read_units(p)
+            for unit in units:
+                current_units[unit.key] = unit
+    logger.info(f"   Unidades (docs + secciones): {len(current_units)}")
+
+    # ─────────────────────────────────────────────────────────────
+    # 2, 4, 5, 6. Sync por Store (en paralelo si hay varios)
+    # ─────────────────────────────────────────────────────────────
+    with profiler.stage("sync"):
+        results = fan_out(lambda target: sync_store(target, current_units), STORE_TARGETS)
+    with profiler.stage("local-index"):
+        update_local_index(file_hashes)
 
     # ─────────────────────────────────────────────────────────────
     # 7. Resumen final
     # ─────────────────────────────────────────────────────────────
-    logger.info(f"\n" + "=" * 70)
-    logger.info(f"📊 RESUMEN DE SINCRONIZACIÓN:")
-    logger.info(f"   ⬆️  Nuevos:       {stats['uploaded']}")
-    logger.info(f"   🔄 Actualizados: {stats['updated']}")
-    logger.info(f"   ✓ Sin cambios:   {stats['unchanged']}")
-    logger.info(f"   🗑️  Eliminados:   {stats['deleted']}")
-    logger.info(f"   📚 Total en Store: {len(new_state)}")
+    for target in STORE_TARGETS:
+        stats = results[target.alias]
+        logger.info(f"\n" + "=" * 70)
+        logger.info(f"📊 RESUMEN DE SINCRONIZACIÓN" + (f" [{target.alias}]:" if len(STORE_TARGETS) > 1 else ":"))
+        logger.info(f"   ⬆️  Nuevos:       {stats['uploaded']}")
+        logger.info(f"   🔄 Actualizados: {stats['updated']}")
+        logger.info(f"   ✓ Sin cambios:   {stats['unchanged']}")
+        logger.info(f"   🗑️  Eliminados:   {stats['deleted']}")
+        if stats["pending"]:
+            logger.info(f"   ⏳ Indexando:    {stats['pending']} (se resuelven en el próximo run)")
+        logger.info(f"   📚 Total en Store: {stats['total']}")
     logger.info(f"=" * 70)
     logger.info(f"\n✅ ¡SYNC COMPLETADO EXITOSAMENTE!")
     logger.info(f"\n👉 File Search Store ID:")
-    logger.info(f"   {STORE_NAME}")
+    for target in STORE_TARGETS:
+        logger.info(f"   {target.store_name}" + (f"  ({target.alias})" if len(STORE_TARGETS) > 1 else ""))
     logger.info(f"\n👉 Úsalo en la configuración del bot:")
-    logger.info(f"   FILE_SEARCH_STORE_NAMES={STORE_NAME}")
+    logger.info(f"   FILE_SEARCH_STORE_NAMES={','.join(t.store_name for t in STORE_TARGETS)}")
 
     # ─────────────────────────────────────────────────────────────
     # 8. Guardar cambios en Git (si estamos en CI/CD)
     # ─────────────────────────────────────────────────────────────
     if os.getenv("CI") or os.getenv("GITHUB_ACTIONS"):
-        logger.info(f"\n💾 PASO 8: Guardando sync_state.json en Git...")
+        state_files = git_state_files()
+        logger.info(f"\n💾 PASO 8: Guardando {', '.join(f.name for f in state_files)} en Git...")
+        commit_state_to_git(state_files)
+
+
+# =========
+# Watch Mode
+# =========
+
+def sync_target_paths(target: StoreTarget, parsed: Dict[str, List[DocUnit]], state: Dict[str, dict]):
+    """
+    Aplica un lote ya preprocesado ({kb_path -> unidades}) al estado en memoria
+    de un Store. Antes resuelve las subidas que seguían indexando.
+    """
+    log = store_logger(target)
+    pending = target.pending
+    before = dict(state)
+    changed_keys = reconcile_pending(pending, state, log)
+    removed_keys = []
+    pending_hashes = pending.pending_hashes()
+    pending_changed = False
+
+    for kb_path, units in parsed.items():
+        old_keys = [k for k in state if unit_path(k) == kb_path]
+        units = [unit for unit in units if target.accepts(unit.fm)]
+
+        for unit in units:
+            entry = state.get(unit.key)
+            if entry and entry.get("hash") == unit.hash:
+                continue
+            pending_hash = pending_hashes.get(unit.key)
+            if pending_hash == unit.hash:
+                continue  # esta versión ya se subió y sigue indexando
+            if pending_hash is not None:
+                pending.supersede(unit.key)
+            log.info(f"   {'🔄' if entry else '⬆️ '} {unit.key}")
+            if entry and entry.get("store_doc_id"):
+                delete_document(entry["store_doc_id"])
+            try:
+                state[unit.key] = state_entry(unit, upload_document(unit, target.store_name, pending))
+                changed_keys.append(unit.key)
+            except UploadPending:
+                log.warning(f"      ⏳ {unit.key}: sigue indexando, queda en {pending.path.name}")
+                state.pop(unit.key, None)  # su doc anterior ya se borró
+                pending_changed = True
+            except Exception as e:
+                log.error(f"      ❌ Error subiendo {unit.key}: {e}")
+
+        current_keys = {unit.key for unit in units}
+        for key in pending_hashes:
+            if unit_path(key) == kb_path and key not in current_keys:
+                pending.supersede(key)
+        for key in old_keys:
+            if key not in current_keys:
+                log.info(f"   🗑️  {key}")
+                delete_document(state[key].get("store_doc_id"))
+                del state[key]
+                removed_keys.append(key)
+
+    if not changed_keys and not removed_keys and not pending_changed:
+        pending.save()
+        return
+
+    save_sync_state(state, target.state_backend)
+    pending.save()
+    publish_manifest(before, state, changed_keys, target.store_name, target.manifest_path)
+
+
+def sync_paths(paths, states: Dict[str, Dict[str, dict]], index: LocalIndex, graph: KbGraph | None = None):
+    """
+    Sincroniza solo `paths` (un lote del watcher) contra el estado en memoria
+    de cada Store (`states` = {alias -> estado}). Los archivos se leen y
+    preprocesan una vez por lote. Un error en un archivo no detiene el watch:
+    su entrada queda como estaba y se reintenta en el próximo evento.
+    """
+    parsed: Dict[str, List[DocUnit]] = {}
+    file_hashes: Dict[str, str] = {}
+    removed = []
+
+    for p in sorted(paths):
         try:
-            import subprocess
-            
-            # Configurar git user (necesario en GitHub Actions)
-            subprocess.run(["git", "config", "--global", "user.email", "sync@github.local"], check=False)
-            subprocess.run(["git", "config", "--global", "user.name", "KB Sync Bot"], check=False)
-            
-            # Add the sync state file
-            result_add = subprocess.run(["git", "add", str(STATE_FILE)], capture_output=True, text=True)
-            if result_add.returncode != 0:
-                logger.warning(f"   ⚠️ Error en 'git add': {result_add.stderr}")
-            
-            # Verificar si hay cambios para commitear
-            result_diff = subprocess.run(["git", "diff", "--cached", "--quiet"], capture_output=True)
-            if result_diff.returncode != 0:  # Hay cambios (exit code 1 si hay diferencias)
-                # Hacer commit
-                result_commit = subprocess.run(
-                    ["git", "commit", "-m", "chore: update sync_state.json after KB sync"],
-                    capture_output=True,
-                    text=True
-                )
-                if result_commit.returncode != 0:
-                    logger.warning(f"   ⚠️ Error en 'git commit': {result_commit.stderr}")
-                else:
-                    logger.info(f"   ✓ Commit realizado")
-                    
-                    # Hacer push
-                    result_push = subprocess.run(
-                        ["git", "push", "origin", "main"],
-                        capture_output=True,
-                        text=True
-                    )
-                    if result_push.returncode != 0:
-                        logger.warning(f"   ⚠️ Error en 'git push': {result_push.stderr}")
-                    else:
-                        logger.info(f"   ✅ sync_state.json pusheado exitosamente")
-            else:
-                logger.info(f"   ✓ No hay cambios en sync_state.json para commitear")
+            _, kb_path = kb_path_of(p)
+        except ValueError:
+            continue  # fuera de kb/
+
+        try:
+            file_hashes[kb_path], parsed[kb_path] = read_units(p)
+        except OSError:
+            # No existe (borrado, incluso entre el evento y la lectura): cuenta como eliminado
+            removed.append(kb_path)
+            parsed[kb_path] = []
+
+    # Índice y grafo: solo los archivos cuyo hash crudo cambió
+    for name, store in (("el índice local", index), ("el grafo del KB", graph)):
+        if store is None:
+            continue
+        try:
+            indexed = store.indexed_hashes()
+            changed = {p: h for p, h in file_hashes.items() if indexed.get(p) != h}
+            gone = [p for p in removed if p in indexed]
+            if changed or gone:
+                store.apply(changed, gone, ROOT)
         except Exception as e:
-            logger.warning(f"   ⚠️ Error al procesar git operations: {e}")
+            logger.warning(f"   ⚠️ No se pudo actualizar {name}: {e}")
+
+    fan_out(lambda target: sync_target_paths(target, parsed, states[target.alias]), STORE_TARGETS)
+
+
+def run_watch():
+    """
+    Modo watch: una pasada completa inicial y luego, en un proceso de larga
+    duración, solo los paths que cambian (micro-lotes con debounce).
+    Cliente, estado e índice local se mantienen en memoria.
+    """
+    main()
+
+    logger.info("\n" + "=" * 70)
+    logger.info("👀 MODO WATCH: sincronizando cambios de kb/ en caliente (Ctrl+C para salir)")
+    logger.info("=" * 70)
+    states = {target.alias: load_sync_state(target.state_backend) for target in STORE_TARGETS}
+    with LocalIndex() as index, KbGraph() as graph:
+        watch(KB_DIR, lambda batch: sync_paths(batch, states, index, graph),
+              force_polling=os.getenv("KB_WATCH_POLLING", "").lower() in ("1", "true"))
 
 
 if __name__ == "__main__":
+    # Cancelar un job de GitHub Actions manda SIGTERM: mismo camino que Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     try:
-        main()
-    except Exception as e:
-        logger.error(f"\n❌ FALLO FATAL: {e}")
-        exit(1)
-
+        with profiler.run("sync_kb_to_store"):
+            if "--watch" in sys.argv[1:]:
+                run_watch()
+            else:
+                main()
+    except (Exception, KeyboardInterrupt) as e:
+        cancelled = isinstance(e, KeyboardInterrupt)
+        logger.error(f"\n❌ SYNC CANCELADO" if cancelled else f"\n❌ FALLO FATAL: {e}")
+        if os.getenv("CI") or os.getenv("GITHUB_ACTIONS"):
+            # Cada Store ya guardó lo completado y las subidas aceptadas quedan
+            # en sync_pending*.json: sin este commit el próximo checkout las
+            # perdería y volvería a subirlas
+            state_files = git_state_files()
+            if state_files:
+                logger.info(f"\n💾 Guardando {', '.join(f.name for f in state_files)} en Git pese al fallo...")
+                commit_state_to_git(state_files)
+        exit(130 if cancelled else 1)
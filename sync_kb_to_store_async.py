@@ -0,0 +1,313 @@
+"""
+Smart Sync (asyncio): misma lógica que sync_kb_to_store.py, pero con corrutinas.
+
+Usa la superficie async del SDK (client.aio) para:
+- Subir documentos
+- Esperar operaciones (polling con asyncio.sleep, sin bloquear hilos)
+- Listar el Store (fallback para obtener el document_id)
+- Borrar documentos obsoletos o eliminados
+
+Concurrencia:
+- Todas las tareas corren en un único event loop bajo un asyncio.Semaphore
+  (SYNC_CONCURRENCY, default 8). Miles de operaciones en vuelo no necesitan
+  miles de hilos.
+
+Cancelación estructurada:
+- Las tareas viven en un asyncio.TaskGroup: si una falla, el resto se cancela.
+- SIGTERM / SIGINT (cancel-in-progress de GitHub Actions) cancelan la tarea
+  principal.
+- En cualquier caso se guarda sync_state.json con el trabajo COMPLETADO:
+  el estado parte del anterior y solo se modifica cuando una subida o un
+  borrado termina, así el siguiente run retoma lo pendiente sin duplicar.
+- Las subidas aceptadas se anotan en sync_pending.json (kb_pending.py): si
+  siguen indexando al cancelar o al agotar la espera, el siguiente run
+  (de cualquiera de los dos engines) las resuelve en vez de re-subirlas.
+
+Un solo Store: FILE_SEARCH_STORE_NAME o el único destino de
+KB_STORE_TARGETS (con su filtro, estado y manifiesto). Con varios destinos
+usa sync_kb_to_store.py.
+
+python sync_kb_to_store_async.py
+"""
+
+import io
+import os
+import asyncio
+import signal
+from typing import Dict, List
+
+import sync_kb_to_store as sync
+from sync_kb_to_store import client, logger
+from kb_pending import PendingUploads, UploadPending
+from kb_state import DEFAULT_ALIAS
+from kb_stores import StoreTarget
+from kb_preprocess import DocUnit, unit_metadata
+from kb_profile import profiler
+from kb_scheduler import UPLOAD_ORDER, order_units
+
+SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", "8"))
+OPERATION_MAX_WAIT_SECONDS = 60
+OPERATION_POLL_SECONDS = 2
+
+
+# =========
+# Async helpers
+# =========
+
+async def delete_document_async(store_doc_id: str) -> bool:
+    """Borra un documento del Store (force=true) sin bloquear el loop"""
+    if not store_doc_id:
+        return False
+    try:
+        await client.aio.file_search_stores.documents.delete(
+            name=store_doc_id,
+            config={"force": True}
+        )
+        logger.info(f"   🗑️  Borrado: {store_doc_id[:60]}...")
+        return True
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.warning(f"   ⚠️ No se pudo borrar {store_doc_id[:60]}: {e}")
+        return False
+
+
+async def wait_for_operation_async(operation):
+    """Espera a que una operación termine (polling cooperativo)"""
+    waited = 0
+    while not operation.done and waited < OPERATION_MAX_WAIT_SECONDS:
+        await asyncio.sleep(OPERATION_POLL_SECONDS)
+        try:
+            operation = await client.aio.operations.get(operation)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass
+        waited += OPERATION_POLL_SECONDS
+
+    if not operation.done:
+        logger.warning(f"   ⚠️ Operación no completó en {OPERATION_MAX_WAIT_SECONDS}s (continuando)")
+    return operation
+
+
+async def find_document_id_async(kb_path: str, store_name: str, chunk: str | None = None) -> str | None:
+    """Busca el document_id por metadata 'path' (y 'chunk') en el listado (con retry)"""
+    for attempt in range(5):
+        try:
+            pager = await client.aio.file_search_stores.documents.list(parent=store_name)
+            async for doc in pager:
+                meta_map = {m.key: m.string_value for m in doc.custom_metadata or []}
+                if meta_map.get("path") == kb_path and meta_map.get("chunk") == chunk:
+                    return str(doc.name)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass
+        if attempt < 4:
+            await asyncio.sleep(2)
+    return None
+
+
+async def upload_document_async(unit: DocUnit, store_name: str, pending: PendingUploads) -> str:
+    """
+    Sube una unidad (doc normalizado o sección) al Store y devuelve su
+    store_doc_id. La operación queda en `pending` desde que la API la acepta;
+    si no termina a tiempo lanza UploadPending (sin buscarla en el listado).
+    """
+    operation = await client.aio.file_search_stores.upload_to_file_search_store(
+        file=io.BytesIO(unit.text.encode("utf-8")),
+        file_search_store_name=store_name,
+        config={
+            "display_name": unit.key,
+            "mime_type": "text/markdown",
+            "custom_metadata": unit_metadata(unit),
+        },
+    )
+    if getattr(operation, "name", None):
+        pending.add(operation.name, unit, store_name)
+    operation = await wait_for_operation_async(operation)
+    if not operation.done:
+        raise UploadPending(f"{unit.key} sigue indexando")
+    if getattr(operation, "error", None):
+        pending.resolve(operation.name)
+        raise Exception(f"La subida de {unit.key} falló: {operation.error}")
+
+    store_doc_id = None
+    if operation.response and getattr(operation.response, "document_name", None):
+        store_doc_id = str(operation.response.document_name)
+    if not store_doc_id or "documents/" not in store_doc_id:
+        store_doc_id = await find_document_id_async(unit.kb_path, store_name, unit.anchor)
+    if not store_doc_id or "documents/" not in store_doc_id:
+        raise UploadPending(f"{unit.key} terminó pero no aparece en el Store todavía")
+    pending.resolve(operation.name)
+    return store_doc_id
+
+
+# =========
+# Main Async Sync Logic
+# =========
+
+def resolve_target() -> StoreTarget:
+    """
+    Destino del engine async: FILE_SEARCH_STORE_NAME o el único de
+    KB_STORE_TARGETS. Con varios destinos se niega a correr (usa el engine
+    con hilos, que hace el fan-out por Store).
+    """
+    if len(sync.STORE_TARGETS) > 1:
+        aliases = ", ".join(t.alias for t in sync.STORE_TARGETS)
+        raise RuntimeError(f"❌ El engine async sincroniza un solo Store y KB_STORE_TARGETS tiene varios "
+                           f"({aliases}): usa python sync_kb_to_store.py")
+    return sync.STORE_TARGETS[0]
+
+
+async def run_sync(target: StoreTarget, state: Dict[str, dict], stats: Dict[str, int], changed_paths: List[str],
+                   pending: PendingUploads):
+    """
+    Ejecuta el diff y las operaciones remotas contra el Store de `target`.
+
+    `state` se muta en sitio a medida que cada operación termina, para que
+    el llamador pueda guardarlo aunque el run se cancele a mitad.
+    """
+    if not target.store_name:
+        logger.info("\n📦 Creando nuevo File Search Store...")
+        store = await client.aio.file_search_stores.create(
+            config={"display_name": sync.STORE_DISPLAY_NAME}
+        )
+        target.store_name = store.name
+        logger.info(f"✅ Store creado: {target.store_name}")
+        logger.info(f"\n👉 IMPORTANTE: Guarda esto en tu .env:")
+        logger.info(f"   FILE_SEARCH_STORE_NAME={target.store_name}")
+    store_name = target.store_name
+
+    old_state = dict(state)
+    md_files = sync.discover_md_files()
+    logger.info(f"   Archivos encontrados: {len(md_files)}")
+
+    current_units: Dict[str, DocUnit] = {}
+    file_hashes = {}
+    for p in md_files:
+        _, kb_path = sync.kb_path_of(p)
+        file_hashes[kb_path], units = sync.read_units(p)
+        for unit in units:
+            if target.accepts(unit.fm):
+                current_units[unit.key] = unit
+
+    semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
+
+    async def replace_one(unit: DocUnit):
+        async with semaphore:
+            old_entry = old_state.get(unit.key)
+            if old_entry and old_entry.get("store_doc_id"):
+                await delete_document_async(old_entry["store_doc_id"])
+            try:
+                store_doc_id = await upload_document_async(unit, store_name, pending)
+            except UploadPending:
+                # Aceptada e indexando: la resuelve el próximo run (su doc anterior ya se borró)
+                state.pop(unit.key, None)
+                stats["pending"] += 1
+                logger.warning(f"   ⏳ {unit.key}: sigue indexando, queda en {pending.path.name}")
+                return
+            state[unit.key] = sync.state_entry(unit, store_doc_id)
+            changed_paths.append(unit.key)
+            stats["updated" if old_entry else "uploaded"] += 1
+            logger.info(f"   ✅ {unit.key} → {store_doc_id[:60]}...")
+
+    async def remove_one(key: str):
+        async with semaphore:
+            store_doc_id = old_state[key].get("store_doc_id")
+            if store_doc_id:
+                await delete_document_async(store_doc_id)
+            state.pop(key, None)
+            stats["deleted"] += 1
+
+    pending_hashes = pending.pending_hashes()
+    to_upload = []
+    for key, unit in current_units.items():
+        old_entry = old_state.get(key)
+        if old_entry and old_entry.get("hash") == unit.hash:
+            stats["unchanged"] += 1
+            continue
+        if pending_hashes.get(key) == unit.hash:
+            stats["pending"] += 1  # esta versión ya se subió y sigue indexando
+            continue
+        if key in pending_hashes:
+            pending.supersede(key)
+        to_upload.append(unit)
+    for key in pending_hashes:
+        if key not in current_units:
+            pending.supersede(key)
+
+    async with asyncio.TaskGroup() as tg:
+        # Las tareas toman el semáforo en orden de creación: orden por tamaño (KB_UPLOAD_ORDER)
+        for unit in order_units(to_upload, UPLOAD_ORDER):
+            tg.create_task(replace_one(unit))
+
+        for key in old_state:
+            if key not in current_units:
+                tg.create_task(remove_one(key))
+
+    sync.update_local_index(file_hashes)
+
+
+async def main_async():
+    logger.info("=" * 70)
+    logger.info(f"🚀 SMART SYNC ASYNC: KB → File Search Store (concurrencia {SYNC_CONCURRENCY})")
+    logger.info("=" * 70)
+
+    # Cancelación externa (GitHub Actions manda SIGINT/SIGTERM)
+    main_task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, main_task.cancel)
+    except (NotImplementedError, RuntimeError):
+        pass  # Windows: sin soporte de señales en el loop
+
+    target = resolve_target()
+    backend = target.state_backend
+    if target.alias != DEFAULT_ALIAS:
+        logger.info(f"   Destino: {target.describe()}")
+    state = sync.load_sync_state(backend)
+    logger.info(f"   Documentos en {backend.path.name}: {len(state)}")
+    old_state = dict(state)
+    stats = {"uploaded": 0, "updated": 0, "unchanged": 0, "deleted": 0, "pending": 0}
+    pending = target.pending
+    # Subidas de runs anteriores que seguían indexando (llamadas bloqueantes, fuera del loop)
+    changed_paths: List[str] = await asyncio.to_thread(sync.reconcile_pending, pending, state)
+
+    try:
+        await run_sync(target, state, stats, changed_paths, pending)
+    except asyncio.CancelledError:
+        logger.warning("\n⚠️ Sync cancelado: guardando el trabajo completado...")
+        raise
+    finally:
+        # Siempre se persiste lo completado (también ante error o cancelación)
+        sync.save_sync_state(state, backend)
+        pending.save()
+        sync.publish_manifest(old_state, state, changed_paths, target.store_name, target.manifest_path)
+        # En CI también ante fallo: sync_pending.json guarda las subidas ya aceptadas
+        if os.getenv("CI") or os.getenv("GITHUB_ACTIONS"):
+            logger.info(f"\n💾 Guardando {backend.path.name} en Git...")
+            sync.commit_state_to_git([f for f in [backend.path] if f.exists()] + pending.files())
+
+    logger.info(f"\n" + "=" * 70)
+    logger.info(f"📊 RESUMEN DE SINCRONIZACIÓN:")
+    logger.info(f"   ⬆️  Nuevos:       {stats['uploaded']}")
+    logger.info(f"   🔄 Actualizados: {stats['updated']}")
+    logger.info(f"   ✓ Sin cambios:   {stats['unchanged']}")
+    logger.info(f"   🗑️  Eliminados:   {stats['deleted']}")
+    if stats["pending"]:
+        logger.info(f"   ⏳ Indexando:    {stats['pending']} (se resuelven en el próximo run)")
+    logger.info(f"   📚 Total en Store: {len(state)}")
+    logger.info(f"=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        with profiler.run("sync_kb_to_store_async"):
+            asyncio.run(main_async())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logger.error(f"\n❌ Sync cancelado (estado parcial guardado)")
+        exit(130)
+    except Exception as e:
+        logger.error(f"\n❌ FALLO FATAL: {e}")
+        exit(1)